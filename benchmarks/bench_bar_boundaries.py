@@ -0,0 +1,76 @@
+"""
+Benchmark of the bar-boundary engine behind TickBar, VolBar and DollarBar against the
+reset-to-zero python loop it replaced. Run from the repository root:
+
+    python -m benchmarks.bench_bar_boundaries --num-ticks 5000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from custombar._bar_kernels import count_boundaries, cumsum_boundaries
+
+
+def _loop_boundaries(arr_in, threshold):
+    """
+    The python loop used by the bar classes before the compiled engine.
+    """
+    ts  = 0
+    idx = []
+    for i, x in enumerate(arr_in):
+        ts += x
+        if ts >= threshold:
+            idx.append(i)
+            ts = 0
+            continue
+    return np.array(idx, dtype=np.int64)
+
+
+def _make_ticks(num_ticks, seed=0):
+    """
+    A day of futures-like ticks: a random walk on a 0.25 tick grid and heavy-tailed trade sizes.
+    """
+    rng    = np.random.default_rng(seed)
+    price  = 4000.0 + 0.25 * np.cumsum(rng.choice([-1, 0, 1], size=num_ticks, p=[0.25, 0.5, 0.25]))
+    volume = np.ceil(rng.pareto(1.5, size=num_ticks) + 1).astype(np.int64)
+    index  = pd.date_range('2020-01-02 09:30', periods=num_ticks, freq='5ms')
+    return pd.DataFrame({'price': price, 'volume': volume}, index=index)
+
+
+def _timeit(func, *args):
+    time0 = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - time0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num-ticks', type=int, default=5000000)
+    parser.add_argument('--bars-per-day', type=int, default=5000)
+    args = parser.parse_args()
+
+    df     = _make_ticks(args.num_ticks)
+    volume = df['volume'].to_numpy(dtype=np.float64)
+    dollar = df['price'].to_numpy(dtype=np.float64) * volume
+    # compile once so that the timings exclude the jit
+    cumsum_boundaries(volume[:10], 1.0)
+
+    cases = [('tick',   np.ones(df.shape[0]), float(args.num_ticks // args.bars_per_day)),
+             ('volume', df['volume'].to_numpy(), volume.sum() / args.bars_per_day),
+             ('dollar', dollar, dollar.sum() / args.bars_per_day)]
+    for name, arr_in, threshold in cases:
+        ref, t_loop = _timeit(_loop_boundaries, arr_in, threshold)
+        if name == 'tick':
+            (out, _), t_fast = _timeit(count_boundaries, arr_in.shape[0], threshold)
+        else:
+            (out, _), t_fast = _timeit(cumsum_boundaries, arr_in.astype(np.float64), threshold)
+        assert np.array_equal(ref, out), '{} boundaries differ from the python loop'.format(name)
+        print('{:<7} bars={:<7d} loop={:8.3f}s engine={:8.4f}s speedup={:8.1f}x ticks/s={:.3e}'.format(
+            name, out.shape[0], t_loop, t_fast, t_loop / t_fast, arr_in.shape[0] / t_fast))
+
+
+if __name__ == '__main__':
+    main()
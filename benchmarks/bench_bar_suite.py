@@ -0,0 +1,300 @@
+"""
+Throughput and memory suite of the bar classes on synthetic tick streams. Every bar class is timed
+end to end (transform) and per stage (_prepare, _extract_bars, _create_bars). The peak memory is
+the peak resident set size added by transform in a fresh process per class and size, so that the
+arrays of the numba kernels are counted and the timings are not slowed down. The results are
+saved as json, and a previous result file can be given to print the change of throughput. Run from
+the repository root:
+
+    python -m benchmarks.bench_bar_suite --sizes 1000000 10000000 --output bench_bars.json
+    python -m benchmarks.bench_bar_suite --sizes 100000000 --classes TickBar VolBar
+    python -m benchmarks.bench_bar_suite --compare bench_bars.json
+    python -m benchmarks.bench_bar_suite --sizes 10000000 --classes TickBar --workers 1 2 4 8
+
+With --workers, build_bars is also timed on a universe of --symbols symbols sharing the first size, once
+per number of worker processes, and the speedup over one worker is reported.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numba
+import numpy as np
+import pandas as pd
+from numba import jit
+
+from custombar import TickBar, VolBar, DollarBar, Imbalance_Bar, Imbalance_Run_Bar, TimeBar, HybridBar, \
+    build_bars
+
+from .bench_transform_memory import _max_rss_mb, _reset_max_rss, _rss_env
+
+BAR_CLASSES = {'TickBar': TickBar, 'VolBar': VolBar, 'DollarBar': DollarBar,
+               'Imbalance_Bar': Imbalance_Bar, 'Imbalance_Run_Bar': Imbalance_Run_Bar, 'TimeBar': TimeBar,
+               'HybridBar': HybridBar}
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _ar1(eps, phi):
+    """
+    AR(1) process x[t] = phi * x[t-1] + sqrt(1 - phi^2) * eps[t], with unit variance for a unit eps.
+    """
+    out   = np.empty_like(eps)
+    scale = np.sqrt(1.0 - phi * phi)
+    x = 0.0
+    for i in range(eps.shape[0]):
+        x = phi * x + scale * eps[i]
+        out[i] = x
+    return out
+
+
+def make_tick_stream(num_ticks, seed=0, clustering=0.999, vol_of_vol=0.5, sigma=0.6, tick_size=0.25,
+                     avg_volume=5.0, tail=1.5, mean_gap_ms=5.0, start_price=4000.0):
+    """
+    Synthetic futures-like ticks. A persistent log-activity factor drives both the price volatility
+    and the trade sizes and arrival rate, so that busy periods have large, frequent and volatile trades.
+
+    # args
+        num_ticks : number of ticks
+        seed : seed of the random generator
+        clustering : persistence in [0, 1) of the activity factor, 0 for independent ticks
+        vol_of_vol : standard deviation of the log-activity factor
+        sigma : standard deviation of a price move, in ticks, at average activity
+        tick_size : price grid
+        avg_volume : mean trade size at average activity
+        tail : pareto index of the trade sizes, smaller for heavier tails
+        mean_gap_ms : mean time between two ticks at average activity, in milliseconds
+        start_price : first price
+    # returns
+        df : dataframe of price and int64 volume with a datetime index, duplicated timestamps included
+    """
+    rng      = np.random.default_rng(seed)
+    activity = np.exp(vol_of_vol * _ar1(rng.standard_normal(num_ticks), clustering))
+    moves    = np.rint(sigma * np.sqrt(activity) * rng.standard_normal(num_ticks))
+    price    = start_price + tick_size * np.cumsum(moves)
+    sizes    = (rng.pareto(tail, size=num_ticks) + 1) * activity * avg_volume * (tail - 1) / tail
+    volume   = np.maximum(np.rint(sizes), 1).astype(np.int64)
+    # exponential arrivals on a millisecond clock, faster when the activity is high
+    gaps     = np.rint(rng.exponential(mean_gap_ms, size=num_ticks) / activity).astype(np.int64)
+    stamps   = np.datetime64('2020-01-02T09:30', 'ms') + np.cumsum(gaps)
+    return pd.DataFrame({'price': price, 'volume': volume}, index=pd.DatetimeIndex(stamps, name='datetime'))
+
+
+def _bar_kwargs(name, df, bars):
+    """
+    Thresholds that give about ``bars`` bars on the stream.
+    """
+    num_ticks = df.shape[0]
+    if name == 'TickBar':
+        return {'threshold': max(num_ticks // bars, 1)}
+    if name == 'VolBar':
+        return {'threshold': float(df['volume'].sum()) / bars}
+    if name == 'DollarBar':
+        return {'threshold': float((df['price'] * df['volume']).sum()) / bars}
+    if name in ('TimeBar', 'HybridBar'):
+        span = (df.index[-1] - df.index[0]) / bars
+        if name == 'TimeBar':
+            return {'freq': max(span, pd.Timedelta(1, 'ms'))}
+        return {'threshold': float(df['volume'].sum()) / bars, 'max_elapsed': 2 * span}
+    return {'exp_num_ticks_init': max(num_ticks // bars, 1)}
+
+
+def _time_stages(bar_class, kwargs, df):
+    stages = {}
+    bars = bar_class(**kwargs)
+    time0 = time.perf_counter()
+    ts, price, volume = bars._prepare(df)
+    bars._reset_open_bar()
+    time1 = time.perf_counter()
+    idx = bars._extract_bars(price, volume, ts)
+    time2 = time.perf_counter()
+    out = bars._create_bars(ts, price, volume, idx)
+    time3 = time.perf_counter()
+    stages['_prepare'], stages['_extract_bars'], stages['_create_bars'] = \
+        time1 - time0, time2 - time1, time3 - time2
+    return stages, out.shape[0]
+
+
+def _time_transform(bar_class, kwargs, df, repeat):
+    times = []
+    for _ in range(repeat):
+        bars  = bar_class(**kwargs)
+        time0 = time.perf_counter()
+        bars.transform(df)
+        times.append(time.perf_counter() - time0)
+    return min(times)
+
+
+def _peak_rss(name, num_ticks, bars, seed, stream_kwargs):
+    """
+    Peak resident set size added by transform, in a fresh process that builds the stream itself, so
+    that the buffers of the numba kernels are counted too.
+    """
+    out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_bar_suite', '--peak-rss', name,
+                          '--sizes', str(num_ticks), '--bars', str(bars), '--seed', str(seed),
+                          '--stream', json.dumps(stream_kwargs)], check=True, capture_output=True, text=True,
+                         env=_rss_env())
+    return json.loads(out.stdout.strip().splitlines()[-1])['peak_rss_mb']
+
+
+def _run_peak_rss(name, num_ticks, bars, seed, stream_kwargs):
+    """
+    Body of the process of _peak_rss.
+    """
+    df = make_tick_stream(num_ticks, seed=seed, **stream_kwargs)
+    kwargs = _bar_kwargs(name, df, bars)
+    # compile outside of the measure
+    BAR_CLASSES[name](**kwargs).transform(df.iloc[:10000])
+    _reset_max_rss()
+    before = _max_rss_mb()
+    BAR_CLASSES[name](**kwargs).transform(df)
+    return {'class': name, 'num_ticks': num_ticks, 'peak_rss_mb': _max_rss_mb() - before}
+
+
+def _version():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, classes, bars=5000, repeat=3, seed=0, **stream_kwargs):
+    """
+    Time and trace the bar classes on synthetic streams of every size.
+
+    # args
+        sizes : numbers of ticks of the streams
+        classes : names of the bar classes, keys of BAR_CLASSES
+        bars : target number of bars of each stream
+        repeat : number of end to end runs, the fastest is kept
+        seed : seed of the streams
+        stream_kwargs : settings of make_tick_stream
+    # returns
+        results : dict of the environment and of one record per class and size
+    """
+    # compile the kernels outside of the measures
+    warm = make_tick_stream(10000, seed=seed, **stream_kwargs)
+    for name in classes:
+        BAR_CLASSES[name](**_bar_kwargs(name, warm, 10)).transform(warm)
+
+    records = []
+    for num_ticks in sizes:
+        df = make_tick_stream(num_ticks, seed=seed, **stream_kwargs)
+        for name in classes:
+            bar_class = BAR_CLASSES[name]
+            kwargs    = _bar_kwargs(name, df, bars)
+            stages, num_bars = _time_stages(bar_class, kwargs, df)
+            total = _time_transform(bar_class, kwargs, df, repeat)
+            record = {'class': name, 'num_ticks': num_ticks, 'num_bars': num_bars, 'seconds': total,
+                      'ticks_per_sec': num_ticks / total, 'stages': stages,
+                      'peak_rss_mb': _peak_rss(name, num_ticks, bars, seed, stream_kwargs)}
+            records.append(record)
+            print('{:<18} ticks={:<10d} bars={:<7d} {:8.3f}s {:10.3e} ticks/s  peak RSS={:8.1f}MB  {}'.format(
+                name, num_ticks, num_bars, total, record['ticks_per_sec'], record['peak_rss_mb'],
+                ' '.join('{}={:.3f}s'.format(k, v) for k, v in stages.items())))
+        del df
+    return {'version': _version(), 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'numba': numba.__version__, 'machine': platform.machine(), 'stream': stream_kwargs,
+            'bars': bars, 'seed': seed, 'results': records}
+
+
+def run_workers(num_ticks, workers, name='TickBar', num_symbols=16, bars=5000, repeat=3, seed=0,
+                **stream_kwargs):
+    """
+    Time build_bars on a universe of symbols for every number of worker processes.
+
+    # args
+        num_ticks : total number of ticks of the universe, split evenly between the symbols
+        workers : numbers of worker processes, num_threads of build_bars
+        name : name of the bar class, key of BAR_CLASSES
+        num_symbols : number of symbols of the universe
+        bars : target number of bars of the universe
+        repeat : number of runs per number of workers, the fastest is kept
+        seed : seed of the first stream, the symbols use the next seeds
+        stream_kwargs : settings of make_tick_stream
+    # returns
+        records : list of one dict per number of workers, with the speedup over the first one
+    """
+    universe = {'S{:03d}'.format(i): make_tick_stream(num_ticks // num_symbols, seed=seed + i, **stream_kwargs)
+                for i in range(num_symbols)}
+    kwargs = _bar_kwargs(name, universe['S000'], max(bars // num_symbols, 1))
+    build_bars({'S000': universe['S000'].iloc[:10000]}, BAR_CLASSES[name], num_threads=1, **kwargs)
+    records = []
+    for num_workers in workers:
+        times = []
+        for _ in range(repeat):
+            time0 = time.perf_counter()
+            build_bars(universe, BAR_CLASSES[name], num_threads=num_workers, **kwargs)
+            times.append(time.perf_counter() - time0)
+        record = {'class': name, 'num_ticks': num_ticks, 'num_symbols': num_symbols, 'workers': num_workers,
+                  'seconds': min(times)}
+        record['speedup'] = records[0]['seconds'] / record['seconds'] if records else 1.0
+        records.append(record)
+        print('build_bars {:<12} symbols={:<4d} workers={:<3d} {:8.3f}s  speedup x{:5.2f}  '
+              'efficiency {:4.0%}'.format(name, num_symbols, num_workers, record['seconds'], record['speedup'],
+                                          record['speedup'] * workers[0] / num_workers))
+    return records
+
+
+def compare(results, reference):
+    """
+    Print the throughput of ``results`` relative to a previous result file.
+    """
+    previous = {(r['class'], r['num_ticks']): r for r in reference['results']}
+    print('change against version {} of {}'.format(reference.get('version'), reference.get('date')))
+    for record in results['results']:
+        ref = previous.get((record['class'], record['num_ticks']))
+        if ref is None:
+            continue
+        # files older than the RSS measure have a python heap peak only, which is not comparable
+        ref_rss = ref.get('peak_rss_mb')
+        print('{:<18} ticks={:<10d} throughput x{:5.2f}  peak RSS x{:5.2f}'.format(
+            record['class'], record['num_ticks'], record['ticks_per_sec'] / ref['ticks_per_sec'],
+            record['peak_rss_mb'] / ref_rss if ref_rss else np.nan))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--classes', nargs='+', default=list(BAR_CLASSES), choices=list(BAR_CLASSES))
+    parser.add_argument('--bars', type=int, default=5000, help='target number of bars per stream')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--clustering', type=float, default=0.999)
+    parser.add_argument('--vol-of-vol', type=float, default=0.5)
+    parser.add_argument('--sigma', type=float, default=0.6)
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='numbers of worker processes of the build_bars sweep')
+    parser.add_argument('--symbols', type=int, default=16, help='number of symbols of the build_bars sweep')
+    parser.add_argument('--output', default='bench_bars.json')
+    parser.add_argument('--peak-rss', default=None, choices=list(BAR_CLASSES), help=argparse.SUPPRESS)
+    parser.add_argument('--stream', default='{}', help=argparse.SUPPRESS)
+    parser.add_argument('--compare', default=None, help='previous result file')
+    args = parser.parse_args()
+
+    if args.peak_rss is not None:
+        record = _run_peak_rss(args.peak_rss, args.sizes[0], args.bars, args.seed, json.loads(args.stream))
+        print(json.dumps(record))
+        return
+    results = run_suite(args.sizes, args.classes, bars=args.bars, repeat=args.repeat, seed=args.seed,
+                        clustering=args.clustering, vol_of_vol=args.vol_of_vol, sigma=args.sigma)
+    if args.workers:
+        results['workers'] = run_workers(args.sizes[0], args.workers, args.classes[0], args.symbols,
+                                         bars=args.bars, repeat=args.repeat, seed=args.seed,
+                                         clustering=args.clustering, vol_of_vol=args.vol_of_vol,
+                                         sigma=args.sigma)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
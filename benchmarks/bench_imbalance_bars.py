@@ -0,0 +1,145 @@
+"""
+Throughput of the compiled Imbalance_Bar and Imbalance_Run_Bar state machines against python per-tick
+loops of the same rules, whose boundaries are checked too. Run from the repository root on synthetic ticks:
+
+    python -m benchmarks.bench_imbalance_bars --num-ticks 200000
+
+or on recorded ticks, a csv with datetime, price and volume columns:
+
+    python -m benchmarks.bench_imbalance_bars --csv ticks.csv
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from custombar import Imbalance_Bar, Imbalance_Run_Bar
+from util import ewma
+
+from .bench_bar_boundaries import _make_ticks
+
+
+def _imbalance(price, prev_price, prev_rule, volume, mode):
+    tick_diff = 0 if prev_price is None else price - prev_price
+    rule = np.sign(tick_diff) if tick_diff != 0 else prev_rule
+    if mode == 'volume':
+        return rule * volume, rule
+    if mode == 'dollar':
+        return rule * volume * price, rule
+    return rule, rule
+
+
+def _expected(window, arr, exp_num_ticks_init):
+    if len(arr) < exp_num_ticks_init:
+        return np.nan
+    ewma_window = int(min(len(arr), window))
+    return ewma(np.array(arr[-ewma_window:], dtype=float), ewma_window)[-1]
+
+
+def _loop_imbalance_bar(price, volume, mode, num_prev_bars, exp_num_ticks_init):
+    """
+    A python per-tick loop of Imbalance_Bar, with the dollar imbalance fixed as in the compiled state
+    machine. The parity with the loop of the original class is tested in tests/test_imbalance_bars.py.
+    """
+    prev_price, prev_rule = None, 0
+    exp_num_ticks, expected = exp_num_ticks_init, np.nan
+    imbalances, num_ticks_bar, idx = [], [], []
+    cum_theta, cum_ticks = 0, 0
+    for i in range(price.shape[0]):
+        imbalance, prev_rule = _imbalance(price[i], prev_price, prev_rule, volume[i], mode)
+        imbalances.append(imbalance)
+        cum_theta += imbalance
+        cum_ticks += 1
+        if np.isnan(expected):
+            expected = _expected(exp_num_ticks, imbalances, exp_num_ticks_init)
+        if np.abs(cum_theta) > exp_num_ticks * np.abs(expected):
+            num_ticks_bar.append(cum_ticks)
+            exp_num_ticks = ewma(np.array(num_ticks_bar[-num_prev_bars:], dtype=float), num_prev_bars)[-1]
+            expected = _expected(exp_num_ticks * num_prev_bars, imbalances, exp_num_ticks_init)
+            idx.append(i)
+            cum_ticks, cum_theta = 0, 0
+        prev_price = price[i]
+    return np.array(idx, dtype=np.int64)
+
+
+def _loop_run_bar(price, volume, mode, num_prev_bars, exp_num_ticks_init):
+    """
+    A python per-tick loop of Imbalance_Run_Bar, with the dollar imbalance and the expected buy proportion
+    fixed as in the compiled state machine. The parity with the loop of the original class is tested in
+    tests/test_imbalance_bars.py.
+    """
+    prev_price, prev_rule = None, 0
+    exp_num_ticks, exp_buy_proportion = exp_num_ticks_init, np.nan
+    expected = {'L': np.nan, 'S': np.nan}
+    imbalances = {'L': [], 'S': []}
+    num_ticks_bar, buy_proportion, idx = [], [], []
+    cum_ticks, buy_ticks, cum_theta_buy, cum_theta_sell = 0, 0, 0, 0
+    for i in range(price.shape[0]):
+        cum_ticks += 1
+        imbalance, prev_rule = _imbalance(price[i], prev_price, prev_rule, volume[i], mode)
+        if imbalance > 0:
+            imbalances['L'].append(imbalance)
+            cum_theta_buy += imbalance
+            buy_ticks += 1
+        elif imbalance < 0:
+            imbalances['S'].append(np.abs(imbalance))
+            cum_theta_sell += np.abs(imbalance)
+        if np.isnan([expected['L'], expected['S']]).any():
+            expected['L'] = _expected(exp_num_ticks, imbalances['L'], exp_num_ticks_init)
+            expected['S'] = _expected(exp_num_ticks, imbalances['S'], exp_num_ticks_init)
+            if not np.isnan([expected['L'], expected['S']]).any():
+                exp_buy_proportion = buy_ticks / cum_ticks
+                cum_theta_buy, cum_theta_sell = 0, 0
+        max_proportion = max(expected['L'] * exp_buy_proportion, expected['S'] * (1 - exp_buy_proportion))
+        if max(cum_theta_buy, cum_theta_sell) > exp_num_ticks * max_proportion:
+            num_ticks_bar.append(cum_ticks)
+            buy_proportion.append(buy_ticks / cum_ticks)
+            exp_num_ticks = ewma(np.array(num_ticks_bar[-num_prev_bars:], dtype=float), num_prev_bars)[-1]
+            exp_buy_proportion = ewma(np.array(buy_proportion[-num_prev_bars:], dtype=float), num_prev_bars)[-1]
+            expected['L'] = _expected(exp_num_ticks * num_prev_bars, imbalances['L'], exp_num_ticks_init)
+            expected['S'] = _expected(exp_num_ticks * num_prev_bars, imbalances['S'], exp_num_ticks_init)
+            idx.append(i)
+            cum_ticks, buy_ticks, cum_theta_buy, cum_theta_sell = 0, 0, 0, 0
+        prev_price = price[i]
+    return np.array(idx, dtype=np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num-ticks', type=int, default=200000)
+    parser.add_argument('--csv', default=None, help='recorded ticks with datetime, price and volume columns')
+    parser.add_argument('--exp-num-ticks-init', type=int, default=1000)
+    parser.add_argument('--num-prev-bars', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.csv is None:
+        df = _make_ticks(args.num_ticks)
+    else:
+        df = pd.read_csv(args.csv, usecols=['datetime', 'price', 'volume'], index_col='datetime',
+                         parse_dates=True)
+    price  = df['price'].to_numpy(dtype=np.float64)
+    volume = df['volume'].to_numpy(dtype=np.float64)
+
+    cases = [('Imbalance_Bar', Imbalance_Bar, _loop_imbalance_bar),
+             ('Imbalance_Run_Bar', Imbalance_Run_Bar, _loop_run_bar)]
+    for name, bar_class, loop in cases:
+        for mode in ['tick', 'volume', 'dollar']:
+            kwargs = dict(mode=mode, num_prev_bars=args.num_prev_bars,
+                          exp_num_ticks_init=args.exp_num_ticks_init)
+            # compile once so that the timings exclude the jit
+            bar_class(**kwargs)._extract_bars(price[:10], volume[:10])
+            time0 = time.perf_counter()
+            ref = loop(price, volume, mode, args.num_prev_bars, args.exp_num_ticks_init)
+            t_loop = time.perf_counter() - time0
+            time0 = time.perf_counter()
+            out = bar_class(**kwargs)._extract_bars(price, volume)
+            t_fast = time.perf_counter() - time0
+            assert np.array_equal(ref, out), '{} {} boundaries differ from the python loop'.format(name, mode)
+            print('{:<17} {:<6} bars={:<6d} loop={:8.3f}s kernel={:8.4f}s speedup={:7.1f}x ticks/s={:.3e}'.format(
+                name, mode, out.shape[0], t_loop, t_fast, t_loop / t_fast, price.shape[0] / t_fast))
+
+
+if __name__ == '__main__':
+    main()
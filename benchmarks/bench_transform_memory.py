@@ -0,0 +1,126 @@
+"""
+Peak memory of the input path of the bars: the former rename / column selection / in-place sort,
+against the array views taken by _BaseBars._prepare. Every case runs in a fresh process, which
+builds the tick dataframe, compiles the kernels on a few ticks and then builds the bars. The peak
+is the growth of the peak resident set size (VmHWM on linux, else ru_maxrss) of that process while
+the bars are built, so that the buffers of numpy, pandas and the numba kernels are all counted. On
+linux the peak is reset before the bars are built, elsewhere it includes the construction of the
+tick dataframe. Run from the repository root:
+
+    python -m benchmarks.bench_transform_memory --num-ticks 20000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+
+import numpy as np
+
+from custombar import VolBar
+
+from .bench_bar_boundaries import _make_ticks
+
+CASES = ['views', 'legacy']
+
+
+def _legacy_input(df):
+    """
+    The input handling of transform before the array views, followed by the copy of the subclasses.
+    """
+    df.rename(columns={'price': 'price'}, inplace=True)
+    df.drop_duplicates()
+    df = df[['price', 'volume']]
+    df.sort_index(inplace=True)
+    df_used = df.copy()
+    return df_used.index.asi8, df_used['price'].to_numpy(), df_used['volume'].to_numpy(dtype=np.float64)
+
+
+def _rss_env():
+    """
+    Environment of the measured processes. A fixed malloc mmap threshold returns the freed large
+    buffers to the system, otherwise glibc keeps the temporaries of the setup resident and the
+    measured step reuses them without growing the resident set.
+    """
+    env = dict(os.environ)
+    env.setdefault('MALLOC_MMAP_THRESHOLD_', '131072')
+    env.setdefault('MALLOC_TRIM_THRESHOLD_', '131072')
+    return env
+
+
+def _max_rss_mb():
+    """
+    Peak resident set size of the process. On linux it is read from VmHWM, which _reset_max_rss resets,
+    whereas ru_maxrss also keeps the peak of the parent process that forked it.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on linux and in bytes on macos
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2**20 if sys.platform == 'darwin' else max_rss / 2**10
+
+
+def _reset_max_rss():
+    """
+    Reset the peak resident set size of the process to the current one, linux only.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _run_case(case, num_ticks):
+    """
+    Body of the process of a case: the peak resident set size before and after building the bars.
+    """
+    df = _make_ticks(num_ticks)
+    bars = VolBar(threshold=df['volume'].sum() / 5000)
+    # compile outside of the measure
+    bars.transform(df.iloc[:10])
+    _reset_max_rss()
+    before = _max_rss_mb()
+    if case == 'legacy':
+        ts, price, volume = _legacy_input(df)
+    else:
+        ts, price, volume = bars._prepare(df)
+    bars._create_bars(ts, price, volume, bars._extract_bars(price, volume))
+    return {'case': case, 'frame_mb': df.memory_usage(index=True).sum() / 2**20, 'before_mb': before,
+            'peak_mb': _max_rss_mb()}
+
+
+def _peak_mb(case, num_ticks):
+    """
+    Run a case in a fresh process and return its measures.
+    """
+    out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_transform_memory', '--case', case,
+                          '--num-ticks', str(num_ticks)], check=True, capture_output=True, text=True,
+                          env=_rss_env())
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num-ticks', type=int, default=20000000)
+    parser.add_argument('--case', choices=CASES, default=None, help='run a single case in this process')
+    args = parser.parse_args()
+
+    if args.case is not None:
+        print(json.dumps(_run_case(args.case, args.num_ticks)))
+        return
+    for case in CASES:
+        record = _peak_mb(case, args.num_ticks)
+        print('{:<7} peak RSS {:8.1f}MB, {:8.1f}MB on top of the {:.0f}MB tick frame'.format(
+            case, record['peak_mb'], record['peak_mb'] - record['before_mb'], record['frame_mb']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Speed and numerical agreement of the causal WaveletDenoiser against the smooth_algo(wvlet_filter)
+baseline, in batch and in streaming. Run from the repository root:
+
+    python -m benchmarks.bench_wavelet_denoiser --num-bars 20000 --window 256
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from filters import WaveletDenoiser, smooth_algo, wvlet_filter
+
+
+def _timeit(func, *args):
+    time0 = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - time0
+
+
+def _stream(denoiser, arr_in):
+    return np.array([denoiser.update(value) for value in arr_in])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num-bars', type=int, default=20000)
+    parser.add_argument('--window', type=int, default=256)
+    parser.add_argument('--wavelet', default='db4')
+    parser.add_argument('--level', type=int, default=1)
+    parser.add_argument('--mad-every', type=int, nargs='+', default=[1, 10])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    arr_in = 100.0 + np.cumsum(rng.normal(0, 0.1, args.num_bars))
+    kwargs = {'wavelet': args.wavelet, 'level': args.level}
+    ref, t_ref = _timeit(smooth_algo, arr_in, args.window, wvlet_filter, kwargs)
+    print('{:<22} {:8.3f}s'.format('smooth_algo baseline', t_ref))
+    for mad_every in args.mad_every:
+        denoiser = WaveletDenoiser(args.window, mad_every=mad_every, **kwargs)
+        out, t_batch = _timeit(denoiser.transform, arr_in)
+        stream, t_stream = _timeit(_stream, denoiser, arr_in)
+        print('mad_every={:<4d} batch {:8.3f}s x{:6.1f}  stream {:8.3f}s x{:6.1f}  max abs diff {:.3e}, '
+              'stream vs batch {:.3e}'.format(mad_every, t_batch, t_ref / t_batch, t_stream, t_ref / t_stream,
+                                              np.abs(out - ref).max(), np.abs(stream - out).max()))
+
+
+if __name__ == '__main__':
+    main()
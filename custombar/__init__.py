@@ -5,4 +5,12 @@ from ._volbar import VolBar
 from ._dollarbar import DollarBar
 from ._imbtickbar import Imbalance_Bar
 from ._imbruntickbar import Imbalance_Run_Bar
-__all__ = ["TickBar","VolBar", "DollarBar", "Imbalance_Bar", "Imbalance_Run_Bar"]
\ No newline at end of file
+from ._timebar import TimeBar
+from ._hybridbar import HybridBar
+from ._readers import read_ticks, read_csv_ticks, read_parquet_ticks, read_memmap_ticks
+from ._multi_symbol import build_bars
+from ._bar_store import BarStore
+from ._bar_kernels import tick_rule
+__all__ = ["TickBar","VolBar", "DollarBar", "Imbalance_Bar", "Imbalance_Run_Bar", "TimeBar", "HybridBar",
+           "read_ticks", "read_csv_ticks", "read_parquet_ticks", "read_memmap_ticks", "build_bars",
+           "tick_rule", "BarStore"]
\ No newline at end of file
@@ -0,0 +1,547 @@
+"""
+Compiled kernels shared by the bar classes. Every kernel works on plain numpy arrays so that the
+per-tick loop runs outside of the python interpreter.
+"""
+
+import numpy as np
+from numba import jit
+
+# codes of the imbalance metrics used by the compiled state machines
+IMBALANCE_METRICS = {'tick': 0, 'volume': 1, 'dollar': 2}
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _grow(arr_in):
+    """
+    Double the capacity of an output buffer, keeping its content.
+    """
+    arr_out = np.empty(2 * arr_in.shape[0], dtype=arr_in.dtype)
+    arr_out[:arr_in.shape[0]] = arr_in
+    return arr_out
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _fill_cumsum_boundaries(arr_in, threshold, start, ts, idx, num):
+    """
+    Inner loop of ``cumsum_boundaries``. It stops as soon as ``idx`` is full so that the caller can grow
+    the buffer outside of the hot loop.
+    """
+    arr_length = arr_in.shape[0]
+    capacity   = idx.shape[0]
+    i = start
+    while i < arr_length and num < capacity:
+        ts += arr_in[i]
+        if ts >= threshold:
+            idx[num] = i
+            num += 1
+            ts = 0.0
+        i += 1
+    return i, ts, num
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def cumsum_boundaries(arr_in, threshold, ts=0.0):
+    """
+    Positions where the running sum of ``arr_in`` reaches ``threshold``. The running sum is reset to
+    zero after every boundary, so a tick that crosses the threshold several times closes a single bar
+    and the excess is dropped.
+
+    :args
+    1. arr_in: (np.ndarray), (float64) the per-tick quantity: volume or dollar value
+    2. threshold: (float64) the sampling threshold
+    3. ts: (float64) the running sum of the open bar carried over from the previous batch
+
+    :return
+    (np.ndarray) (int64) the positions of the closing ticks, and the running sum of the open bar
+    """
+    idx = np.empty(1024, dtype=np.int64)
+    i, num = 0, 0
+    while True:
+        i, ts, num = _fill_cumsum_boundaries(arr_in, threshold, i, ts, idx, num)
+        if i >= arr_in.shape[0]:
+            break
+        idx = _grow(idx)
+    return idx[:num], ts
+
+
+def count_boundaries(num_ticks, threshold, count=0):
+    """
+    Positions where the running tick count reaches ``threshold``, with the same reset-to-zero logic
+    as ``cumsum_boundaries``.
+
+    :args
+    1. num_ticks: (int) the number of ticks
+    2. threshold: (float) the sampling threshold
+    3. count: (int) the number of ticks of the open bar carried over from the previous batch
+
+    :return
+    (np.ndarray) (int64) the positions of the closing ticks, and the number of ticks of the open bar
+    """
+    step = max(int(np.ceil(threshold)), 1)
+    idx  = np.arange(max(step - 1 - count, 0), num_ticks, step, dtype=np.int64)
+    if idx.shape[0] == 0:
+        return idx, count + num_ticks
+    return idx, num_ticks - 1 - idx[-1]
+
+
+def tick_rule(price, prev_price=np.nan, prev_rule=0.0):
+    """
+    Tick rule (pg 29) of a whole price array: the sign of the price change, or the previous sign when
+    the price does not change. The seed state is the last price and sign of the previous chunk, so
+    that chunks can be chained.
+
+    :args
+    1. price: (np.ndarray) the tick prices
+    2. prev_price: (float) the price of the tick before ``price[0]``, nan if there is none
+    3. prev_rule: (float) the sign of the tick before ``price[0]``, 0 if there is none
+
+    :return
+    (np.ndarray) (float64) the signs of the ticks (-1, 0 or 1), and the (prev_price, prev_rule) state of
+    the next chunk
+    """
+    price = np.asarray(price, dtype=np.float64)
+    if price.shape[0] == 0:
+        return np.empty(0, dtype=np.float64), (prev_price, prev_rule)
+    tick_diff = np.empty(price.shape[0], dtype=np.float64)
+    tick_diff[0]  = 0.0 if np.isnan(prev_price) else price[0] - prev_price
+    tick_diff[1:] = np.diff(price)
+    sign = np.sign(tick_diff)
+    # position of the last nonzero sign up to each tick, -1 before the first one
+    last = np.where(sign != 0, np.arange(price.shape[0]), -1)
+    np.maximum.accumulate(last, out=last)
+    signs = np.where(last >= 0, sign[last], prev_rule)
+    return signs, (price[-1], signs[-1])
+
+
+# fields of the bar accumulators, and of the columns returned by aggregate_bars
+BAR_FIELDS = ('ticks', 'open', 'high', 'low', 'close', 'volume', 'dollar_value', 'buy_volume', 'signed_volume')
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _add_tick(acc, price, volume, sign):
+    """
+    Add one tick to a row of accumulators laid out as BAR_FIELDS.
+    """
+    if acc[0] == 0:
+        acc[1], acc[2], acc[3] = price, price, price
+    else:
+        acc[2] = max(acc[2], price)
+        acc[3] = min(acc[3], price)
+    acc[0] += 1
+    acc[4] = price
+    acc[5] += volume
+    acc[6] += price * volume
+    if sign > 0:
+        acc[7] += volume
+    acc[8] += sign * volume
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _tick_sign(price, prev_price, prev_rule):
+    """
+    Tick rule (pg 29) of one tick, nan ``prev_price`` if there is no previous tick.
+    """
+    if not np.isnan(prev_price) and price != prev_price:
+        return 1.0 if price > prev_price else -1.0
+    return prev_rule
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def aggregate_bars(ts, price, volume, idx, shared_tick, final, acc, flags, signed, tick_state):
+    """
+    Single pass that turns the closing positions of the bars into bar columns.
+
+    A bar is closed on the last tick that carries the timestamp of its closing tick, so ticks with
+    the same timestamp never end up in two different bars and several closing ticks with the same
+    timestamp give a single bar. Ticks before the first closing tick are not sampled, and each bar is
+    labelled by the timestamp of the previous closing tick.
+
+    The open bar lives in ``acc`` and ``flags``, which are updated in place, so that a stream of ticks
+    can be aggregated batch by batch. A bar whose closing timestamp is the last one of the batch stays
+    pending until a later timestamp arrives, or until a call with ``final``.
+
+    :args
+    1. ts: (np.ndarray), (int64) the tick timestamps, sorted
+    2. price: (np.ndarray), (float64) the tick prices
+    3. volume: (np.ndarray), (float64) the tick volumes
+    4. idx: (np.ndarray), (int64) the sorted positions of the closing ticks, -1 closes on the last tick of
+       the previous batch
+    5. shared_tick: (bool) if True, the ticks of the previous closing timestamp are also counted at the
+       start of the next bar, which is what the label-based ``df.loc[start:end]`` slicing did
+    6. final: (bool) close the pending bar at the end of the batch
+    7. acc: (np.ndarray), (float64) 2 x len(BAR_FIELDS) accumulators of the open bar (row 0) and of the
+       ticks of the current timestamp (row 1)
+    8. flags: (np.ndarray), (int64) [last timestamp, has last timestamp, pending close, label of the open
+       bar, has label]
+    9. signed: (bool) sign the ticks with the tick rule for the buy and signed volume fields, otherwise the
+       ticks are unsigned and these fields stay at zero
+    10. tick_state: (np.ndarray), (float64) [previous price, previous tick rule] of the tick rule, nan
+        previous price if there is no previous tick
+
+    :return
+    (tuple) np.ndarray (int64) of the bar labels and np.ndarray (float64) of the BAR_FIELDS x bars columns
+    """
+    last_ts, has_last, pending, anchor, has_anchor = flags[0], flags[1], flags[2], flags[3], flags[4]
+    prev_price, prev_rule = tick_state[0], tick_state[1]
+    sign     = 0.0
+    max_bars = idx.shape[0] + 1
+    label    = np.empty(max_bars, dtype=np.int64)
+    out      = np.empty((acc.shape[1], max_bars), dtype=np.float64)
+    num, j   = 0, 0
+    while j < idx.shape[0] and idx[j] < 0:
+        pending = has_last
+        j += 1
+    for i in range(ts.shape[0] + 1):
+        if i == ts.shape[0]:
+            if not final:
+                break
+            change = True
+        else:
+            change = has_last == 1 and ts[i] != last_ts
+        if change and pending == 1:
+            if has_anchor == 1:
+                label[num] = anchor
+                out[:, num] = acc[0]
+                num += 1
+            anchor, has_anchor, pending = last_ts, 1, 0
+            if shared_tick:
+                acc[0] = acc[1]
+            else:
+                acc[0] = 0.0
+        if change:
+            acc[1] = 0.0
+        if i == ts.shape[0]:
+            break
+        if signed:
+            prev_rule  = _tick_sign(price[i], prev_price, prev_rule)
+            prev_price = price[i]
+            sign = prev_rule
+        _add_tick(acc[0], price[i], volume[i], sign)
+        _add_tick(acc[1], price[i], volume[i], sign)
+        while j < idx.shape[0] and idx[j] <= i:
+            pending = 1
+            j += 1
+        last_ts, has_last = ts[i], 1
+    flags[0], flags[1], flags[2], flags[3], flags[4] = last_ts, has_last, pending, anchor, has_anchor
+    tick_state[0], tick_state[1] = prev_price, prev_rule
+    return label[:num], out[:, :num]
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def aggregate_time_bars(ts, price, volume, freq, origin, final, acc, flags, signed, tick_state):
+    """
+    Single pass that groups the ticks by clock interval of length ``freq`` starting from ``origin``. A bar
+    is labelled by the start of its interval, like ``resample``, and empty intervals give no bar.
+
+    The open bar lives in ``acc`` and ``flags`` as for ``aggregate_bars``, and is closed by the first
+    tick of a later interval, or by a call with ``final``.
+
+    :args
+    1. ts: (np.ndarray), (int64) the tick timestamps, sorted
+    2. price: (np.ndarray), (float64) the tick prices
+    3. volume: (np.ndarray), (float64) the tick volumes
+    4. freq: (int) length of the intervals, in the unit of ``ts``
+    5. origin: (int) start of the first interval, in the unit of ``ts``
+    6. final: (bool) close the open bar at the end of the batch
+    7. acc: (np.ndarray), (float64) 2 x len(BAR_FIELDS) accumulators, the open bar is row 0
+    8. flags: (np.ndarray), (int64) [interval of the open bar, has open bar, ...]
+    9. signed: (bool) sign the ticks with the tick rule, see ``aggregate_bars``
+    10. tick_state: (np.ndarray), (float64) [previous price, previous tick rule] of the tick rule
+
+    :return
+    (tuple) np.ndarray (int64) of the bar labels and np.ndarray (float64) of the BAR_FIELDS x bars columns
+    """
+    bucket, has_bar = flags[0], flags[1]
+    prev_price, prev_rule = tick_state[0], tick_state[1]
+    sign     = 0.0
+    max_bars = ts.shape[0] + 1
+    label    = np.empty(max_bars, dtype=np.int64)
+    out      = np.empty((acc.shape[1], max_bars), dtype=np.float64)
+    num      = 0
+    for i in range(ts.shape[0]):
+        tick_bucket = (ts[i] - origin) // freq
+        if has_bar == 1 and tick_bucket != bucket:
+            label[num] = origin + bucket * freq
+            out[:, num] = acc[0]
+            num += 1
+            acc[0] = 0.0
+        if signed:
+            prev_rule  = _tick_sign(price[i], prev_price, prev_rule)
+            prev_price = price[i]
+            sign = prev_rule
+        _add_tick(acc[0], price[i], volume[i], sign)
+        bucket, has_bar = tick_bucket, 1
+    if final and has_bar == 1:
+        label[num] = origin + bucket * freq
+        out[:, num] = acc[0]
+        num += 1
+        acc[0] = 0.0
+        has_bar = 0
+    flags[0], flags[1] = bucket, has_bar
+    tick_state[0], tick_state[1] = prev_price, prev_rule
+    return label[:num], out[:, :num]
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _fill_hybrid_boundaries(arr_in, ts, threshold, max_elapsed, state, clock, start, idx, num):
+    """
+    Inner loop of ``hybrid_boundaries``, stops when ``idx`` is full.
+    """
+    cum, open_ts, has_open = state[0], clock[0], clock[1]
+    capacity = idx.shape[0]
+    i = start
+    while i < arr_in.shape[0] and num < capacity - 1:
+        if has_open == 1 and ts[i] - open_ts >= max_elapsed:
+            # the bar is too old, it closes on the previous tick
+            idx[num] = i - 1
+            num += 1
+            cum, has_open = 0.0, 0
+        if has_open == 0:
+            open_ts, has_open = ts[i], 1
+        cum += arr_in[i]
+        if cum >= threshold:
+            idx[num] = i
+            num += 1
+            cum, has_open = 0.0, 0
+        i += 1
+    state[0], clock[0], clock[1] = cum, open_ts, has_open
+    return i, num
+
+
+def hybrid_boundaries(arr_in, ts, threshold, max_elapsed, state, clock):
+    """
+    Positions where the running sum of ``arr_in`` reaches ``threshold``, or where the open bar has lasted
+    ``max_elapsed``, whichever comes first. The sum is reset to zero after each boundary as in
+    ``cumsum_boundaries``. A bar that is too old closes on the tick before the first tick that is
+    ``max_elapsed`` or more after its opening tick, this is -1 if that tick is the first of the batch.
+
+    :args
+    1. arr_in: (np.ndarray), (float64) the sampled quantity of each tick
+    2. ts: (np.ndarray), (int64) the tick timestamps, sorted
+    3. threshold: (float) the sampling threshold
+    4. max_elapsed: (int) the longest duration of a bar, in the unit of ``ts``
+    5. state: (np.ndarray), (float64) [running sum] of the open bar, updated in place
+    6. clock: (np.ndarray), (int64) [opening timestamp, has open bar] of the open bar, updated in place
+
+    :return
+    (np.ndarray) (int64) the positions of the closing ticks
+    """
+    idx = np.empty(max(16, arr_in.shape[0] // 64), dtype=np.int64)
+    i, num = 0, 0
+    while True:
+        i, num = _fill_hybrid_boundaries(arr_in, ts, threshold, max_elapsed, state, clock, i, idx, num)
+        if i >= arr_in.shape[0]:
+            return idx[:num]
+        idx = _grow(idx)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _ewma_ring(buf, count, num, window):
+    """
+    Last value of ``util.ewma`` over the ``num`` most recent values of a ring buffer into which ``count``
+    values have been written so far. The arithmetic is the same as ``util.ewma`` so both agree exactly.
+    """
+    capacity = buf.shape[0]
+    start    = (count - num) % capacity
+    alpha    = 2 / (window + 1)
+    weight   = 1.0
+    ewma_old = buf[start]
+    for i in range(1, num):
+        weight += (1 - alpha)**i
+        ewma_old = ewma_old * (1 - alpha) + buf[(start + i) % capacity]
+    return ewma_old / weight
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _expected_imbalance(buf, count, window, exp_num_ticks_init):
+    """
+    Expected imbalance 2P[b_t=1]-1 as an ewma over the last ``window`` imbalances, pg 29. It is nan until
+    ``exp_num_ticks_init`` imbalances have been seen, and the window is capped by the buffer size.
+    """
+    if count < exp_num_ticks_init:
+        return np.nan
+    if window < count:
+        ewma_window = int(window)
+    else:
+        ewma_window = count
+    ewma_window = min(ewma_window, buf.shape[0])
+    if ewma_window < 1:
+        return np.nan
+    return _ewma_ring(buf, count, ewma_window, ewma_window)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _signed_imbalance(price, prev_price, prev_rule, volume, metric):
+    """
+    Tick rule (pg 29) and the imbalance of one tick. ``metric`` is 0 for tick, 1 for volume and 2 for
+    dollar imbalance. Returns the imbalance and the updated previous tick rule.
+    """
+    tick_diff = 0.0
+    if not np.isnan(prev_price):
+        tick_diff = price - prev_price
+    if tick_diff != 0:
+        prev_rule = np.sign(tick_diff)
+    if metric == 1:
+        return prev_rule * volume, prev_rule
+    if metric == 2:
+        return prev_rule * volume * price, prev_rule
+    return prev_rule, prev_rule
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _fill_imbalance_boundaries(price, volume, metric, exp_num_ticks_init, state, imb_buf, bar_buf,
+                               start, idx, num):
+    """
+    Inner loop of ``imbalance_boundaries``, stops when ``idx`` is full.
+    """
+    prev_price, prev_rule = state[0], state[1]
+    count, num_bars       = np.int64(state[2]), np.int64(state[3])
+    exp_num_ticks, exp_imbalance = state[4], state[5]
+    cum_theta, cum_ticks  = state[6], np.int64(state[7])
+    num_prev_bars = bar_buf.shape[0]
+    capacity      = imb_buf.shape[0]
+    i = start
+    while i < price.shape[0] and num < idx.shape[0]:
+        imbalance, prev_rule = _signed_imbalance(price[i], prev_price, prev_rule, volume[i], metric)
+        imb_buf[count % capacity] = imbalance
+        count += 1
+        cum_theta += imbalance
+        cum_ticks += 1
+        if np.isnan(exp_imbalance):
+            exp_imbalance = _expected_imbalance(imb_buf, count, exp_num_ticks, exp_num_ticks_init)
+        if np.abs(cum_theta) > exp_num_ticks * np.abs(exp_imbalance):
+            bar_buf[num_bars % num_prev_bars] = cum_ticks
+            num_bars += 1
+            # Expected number of ticks based on formed bars
+            exp_num_ticks = _ewma_ring(bar_buf, num_bars, min(num_bars, num_prev_bars), num_prev_bars)
+            exp_imbalance = _expected_imbalance(imb_buf, count, exp_num_ticks * num_prev_bars,
+                                                exp_num_ticks_init)
+            idx[num] = i
+            num += 1
+            cum_ticks, cum_theta = 0, 0.0
+        prev_price = price[i]
+        i += 1
+    state[0], state[1], state[2], state[3] = prev_price, prev_rule, count, num_bars
+    state[4], state[5], state[6], state[7] = exp_num_ticks, exp_imbalance, cum_theta, cum_ticks
+    return i, num
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def imbalance_boundaries(price, volume, metric, exp_num_ticks_init, state, imb_buf, bar_buf):
+    """
+    State machine of the imbalance bars. All the information carried between ticks lives in ``state``,
+    ``imb_buf`` and ``bar_buf``, which are updated in place, so memory does not grow with the ticks.
+
+    :args
+    1. price: (np.ndarray), (float64) the tick prices
+    2. volume: (np.ndarray), (float64) the tick volumes
+    3. metric: (int64) 0 for tick, 1 for volume and 2 for dollar imbalance
+    4. exp_num_ticks_init: (int64) number of imbalances needed before the first expectation
+    5. state: (np.ndarray), (float64) [prev_price, prev_tick_rule, num_imbalances, num_bars,
+       exp_num_ticks, expected_imbalance, cum_theta, cum_ticks]
+    6. imb_buf: (np.ndarray), (float64) ring buffer of the most recent imbalances
+    7. bar_buf: (np.ndarray), (float64) ring buffer of the tick counts of the last num_prev_bars bars
+
+    :return
+    (np.ndarray) (int64) the positions of the closing ticks
+    """
+    idx = np.empty(1024, dtype=np.int64)
+    i, num = 0, 0
+    while True:
+        i, num = _fill_imbalance_boundaries(price, volume, metric, exp_num_ticks_init, state, imb_buf,
+                                            bar_buf, i, idx, num)
+        if i >= price.shape[0]:
+            break
+        idx = _grow(idx)
+    return idx[:num]
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _fill_run_boundaries(price, volume, metric, exp_num_ticks_init, state, buy_buf, sell_buf, bar_buf,
+                         start, idx, num):
+    """
+    Inner loop of ``run_boundaries``, stops when ``idx`` is full.
+    """
+    prev_price, prev_rule = state[0], state[1]
+    count_buy, count_sell, num_bars = np.int64(state[2]), np.int64(state[3]), np.int64(state[4])
+    exp_num_ticks, exp_buy_proportion = state[5], state[6]
+    exp_buy, exp_sell      = state[7], state[8]
+    cum_ticks, buy_ticks   = np.int64(state[9]), np.int64(state[10])
+    cum_theta_buy, cum_theta_sell = state[11], state[12]
+    num_prev_bars = bar_buf.shape[1]
+    i = start
+    while i < price.shape[0] and num < idx.shape[0]:
+        cum_ticks += 1
+        imbalance, prev_rule = _signed_imbalance(price[i], prev_price, prev_rule, volume[i], metric)
+        if imbalance > 0:
+            buy_buf[count_buy % buy_buf.shape[0]] = imbalance
+            count_buy += 1
+            cum_theta_buy += imbalance
+            buy_ticks += 1
+        elif imbalance < 0:
+            sell_buf[count_sell % sell_buf.shape[0]] = -imbalance
+            count_sell += 1
+            cum_theta_sell += -imbalance
+        if np.isnan(exp_buy) or np.isnan(exp_sell):
+            # warm-up: both expectations are needed before the first bar
+            if count_buy >= exp_num_ticks_init and count_sell >= exp_num_ticks_init:
+                exp_buy  = _expected_imbalance(buy_buf, count_buy, exp_num_ticks, exp_num_ticks_init)
+                exp_sell = _expected_imbalance(sell_buf, count_sell, exp_num_ticks, exp_num_ticks_init)
+                if not (np.isnan(exp_buy) or np.isnan(exp_sell)):
+                    exp_buy_proportion = buy_ticks / cum_ticks
+                    cum_theta_buy, cum_theta_sell = 0.0, 0.0
+        max_proportion = max(exp_buy * exp_buy_proportion, exp_sell * (1 - exp_buy_proportion))
+        if max(cum_theta_buy, cum_theta_sell) > exp_num_ticks * max_proportion:
+            slot = num_bars % num_prev_bars
+            bar_buf[0, slot] = cum_ticks
+            bar_buf[1, slot] = buy_ticks / cum_ticks
+            num_bars += 1
+            num_hist = min(num_bars, num_prev_bars)
+            # Expected number of ticks and buy ticks proportion based on formed bars
+            exp_num_ticks      = _ewma_ring(bar_buf[0], num_bars, num_hist, num_prev_bars)
+            exp_buy_proportion = _ewma_ring(bar_buf[1], num_bars, num_hist, num_prev_bars)
+            exp_buy  = _expected_imbalance(buy_buf, count_buy, exp_num_ticks * num_prev_bars,
+                                           exp_num_ticks_init)
+            exp_sell = _expected_imbalance(sell_buf, count_sell, exp_num_ticks * num_prev_bars,
+                                           exp_num_ticks_init)
+            idx[num] = i
+            num += 1
+            cum_ticks, buy_ticks, cum_theta_buy, cum_theta_sell = 0, 0, 0.0, 0.0
+        prev_price = price[i]
+        i += 1
+    state[0], state[1], state[2], state[3], state[4] = prev_price, prev_rule, count_buy, count_sell, num_bars
+    state[5], state[6], state[7], state[8] = exp_num_ticks, exp_buy_proportion, exp_buy, exp_sell
+    state[9], state[10], state[11], state[12] = cum_ticks, buy_ticks, cum_theta_buy, cum_theta_sell
+    return i, num
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def run_boundaries(price, volume, metric, exp_num_ticks_init, state, buy_buf, sell_buf, bar_buf):
+    """
+    State machine of the imbalance run bars, the buy and sell sides keep their own bounded history.
+
+    :args
+    1. price: (np.ndarray), (float64) the tick prices
+    2. volume: (np.ndarray), (float64) the tick volumes
+    3. metric: (int64) 0 for tick, 1 for volume and 2 for dollar imbalance
+    4. exp_num_ticks_init: (int64) number of imbalances per side needed before the first expectation
+    5. state: (np.ndarray), (float64) [prev_price, prev_tick_rule, num_buy, num_sell, num_bars,
+       exp_num_ticks, exp_buy_proportion, expected_imbalance L, expected_imbalance S, cum_ticks, buy_ticks,
+       cum_theta_buy, cum_theta_sell]
+    6. buy_buf: (np.ndarray), (float64) ring buffer of the most recent buy imbalances
+    7. sell_buf: (np.ndarray), (float64) ring buffer of the most recent absolute sell imbalances
+    8. bar_buf: (np.ndarray), (float64) 2 x num_prev_bars ring buffer of the tick counts and the buy
+       proportions of the previous bars
+
+    :return
+    (np.ndarray) (int64) the positions of the closing ticks
+    """
+    idx = np.empty(1024, dtype=np.int64)
+    i, num = 0, 0
+    while True:
+        i, num = _fill_run_boundaries(price, volume, metric, exp_num_ticks_init, state, buy_buf, sell_buf,
+                                      bar_buf, i, idx, num)
+        if i >= price.shape[0]:
+            break
+        idx = _grow(idx)
+    return idx[:num]
@@ -0,0 +1,189 @@
+"""
+Columnar on-disk store of bars. Each symbol is a directory holding one raw binary file per column, the
+int64 timestamps of the index included, with the rows sorted by time and partitioned by calendar date.
+The partition table lives in a small json file, so that the bars of a date range are a contiguous slice
+of every column and can be read through memory maps without deserializing anything.
+
+    root/
+        ESZ0/
+            meta.json          dtypes and partitions [day, first row, end row]
+            datetime.bin       int64 timestamps
+            open.bin
+            ...
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from ._base_bars import _days, _to_datetime_index
+
+INDEX_FILE = 'datetime'
+META_FILE  = 'meta.json'
+# suffixes of the directories of a rewrite in progress, never listed as symbols
+TMP_SUFFIX = '.tmp'
+OLD_SUFFIX = '.old'
+
+
+def _day_number(date):
+    return (pd.Timestamp(date).tz_localize(None).normalize() - pd.Timestamp(0)) // pd.Timedelta('1D')
+
+
+class BarStore:
+    """
+    Store of the bars of many symbols, see the module docstring for the layout.
+    """
+
+    def __init__(self, root):
+        """
+        Constructor
+
+        # args
+            root : directory of the store, created if needed
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def symbols(self):
+        """
+        The symbols in the store.
+        """
+        return sorted(name for name in os.listdir(self.root)
+                      if not name.endswith((TMP_SUFFIX, OLD_SUFFIX))
+                      and os.path.isfile(os.path.join(self.root, name, META_FILE)))
+
+    def dates(self, symbol):
+        """
+        The dates stored for a symbol, as a DatetimeIndex of days.
+        """
+        meta = self._read_meta(symbol)
+        days = np.array([part[0] for part in meta['partitions']], dtype=np.int64)
+        return pd.DatetimeIndex(days.astype('M8[D]'), name='date')
+
+    def write(self, symbol, bars):
+        """
+        Write the bars of a symbol. Bars later than the last stored bar are appended to the column files,
+        the last stored day included. Otherwise the dates of ``bars`` replace the stored bars of the same
+        dates and the symbol is rewritten.
+
+        # args
+            symbol : name of the symbol
+            bars : dataframe with a datetime index and numeric columns, such as the output of the bars
+        """
+        if not isinstance(bars.index, pd.DatetimeIndex):
+            raise ValueError('the bars should have a DatetimeIndex')
+        bars = bars if bars.index.is_monotonic_increasing else bars.sort_index(kind='stable')
+        ts   = bars.index.asi8
+        days = _days(ts, bars.index.dtype)
+        columns = {col: bars[col].to_numpy() for col in bars.columns}
+        objects = [col for col, arr in columns.items() if arr.dtype.kind not in 'biufcmM']
+        if objects:
+            raise ValueError('the columns {} are not numeric and cannot be stored'.format(objects))
+        meta = {'index_dtype': str(bars.index.dtype),
+                'columns': {col: arr.dtype.str for col, arr in columns.items()}}
+        path = os.path.join(self.root, symbol)
+        if os.path.isfile(os.path.join(path, META_FILE)):
+            old = self._read_meta(symbol)
+            if old['index_dtype'] != meta['index_dtype'] or old['columns'] != meta['columns']:
+                raise ValueError('the bars of {} do not have the stored columns and dtypes {}'.format(
+                    symbol, old['columns']))
+            if len(ts) and old['partitions'] and ts[0] <= self._last_timestamp(symbol, old):
+                # the bars overlap the stored ones: merge and rewrite
+                keep = self.read(symbol)
+                keep = keep[~np.isin(_days(keep.index.asi8, keep.index.dtype), days)]
+                self._rewrite(symbol, pd.concat([keep, bars]).sort_index(kind='stable'))
+                return
+            meta['partitions'] = old['partitions']
+            mode = 'ab'
+        else:
+            os.makedirs(path, exist_ok=True)
+            meta['partitions'] = []
+            mode = 'wb'
+        num_rows = meta['partitions'][-1][2] if meta['partitions'] else 0
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(days)) + 1, [len(ts)]]) if len(ts) else []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if meta['partitions'] and meta['partitions'][-1][0] == days[start]:
+                # later bars of the last stored day extend its partition
+                meta['partitions'][-1][2] = int(num_rows + end)
+                continue
+            meta['partitions'].append([int(days[start]), int(num_rows + start), int(num_rows + end)])
+        for name, arr in [(INDEX_FILE, ts)] + list(columns.items()):
+            file_path = os.path.join(path, name + '.bin')
+            if mode == 'ab':
+                # drop the rows of a failed write, past the stored partitions, before appending
+                os.truncate(file_path, num_rows * arr.dtype.itemsize)
+            with open(file_path, mode) as f:
+                f.write(np.ascontiguousarray(arr).tobytes())
+        # the meta is written last, a failed write leaves the stored partitions readable and its rows
+        # are dropped by the next write
+        with open(os.path.join(path, META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+    def read_arrays(self, symbol, start=None, end=None, columns=None):
+        """
+        Memory-mapped views of the bars of a symbol between two dates, without copy.
+
+        # args
+            symbol : name of the symbol
+            start : first date, included, None for the first stored date
+            end : last date, included, None for the last stored date
+            columns : columns to read, None for all of them
+        # returns
+            ts : np.ndarray of the int64 timestamps
+            arrays : dict of column name to read-only np.ndarray
+        """
+        meta = self._read_meta(symbol)
+        parts = np.array(meta['partitions'], dtype=np.int64).reshape(-1, 3)
+        lo = 0 if start is None else np.searchsorted(parts[:, 0], _day_number(start), side='left')
+        hi = len(parts) if end is None else np.searchsorted(parts[:, 0], _day_number(end), side='right')
+        first = parts[lo, 1] if lo < hi else 0
+        last  = parts[hi - 1, 2] if lo < hi else 0
+        num_rows = parts[-1, 2] if len(parts) else 0
+        columns  = list(meta['columns']) if columns is None else list(columns)
+        path = os.path.join(self.root, symbol)
+        arrays = {}
+        for name in [INDEX_FILE] + columns:
+            dtype = np.dtype(np.int64 if name == INDEX_FILE else meta['columns'][name])
+            if num_rows == 0:
+                arrays[name] = np.empty(0, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(os.path.join(path, name + '.bin'), dtype=dtype, mode='r',
+                                     shape=(num_rows,))[first:last]
+        return arrays.pop(INDEX_FILE), arrays
+
+    def read(self, symbol, start=None, end=None, columns=None):
+        """
+        Dataframe of the bars of a symbol between two dates, see read_arrays. The columns are backed by the
+        memory maps, the index of a tz-aware store is converted.
+        """
+        ts, arrays = self.read_arrays(symbol, start, end, columns)
+        index = _to_datetime_index(np.asarray(ts), pd.api.types.pandas_dtype(self._read_meta(symbol)['index_dtype']))
+        return pd.DataFrame(arrays, index=index, copy=False)
+
+    def _rewrite(self, symbol, bars):
+        """
+        Write the bars of a symbol from scratch in a temporary directory, then swap it with the stored one.
+        """
+        path = os.path.join(self.root, symbol)
+        tmp, old = path + TMP_SUFFIX, path + OLD_SUFFIX
+        # leftovers of a failed rewrite
+        for stale in (tmp, old):
+            if os.path.isdir(stale):
+                shutil.rmtree(stale)
+        self.write(symbol + TMP_SUFFIX, bars)
+        os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old)
+
+    def _last_timestamp(self, symbol, meta):
+        num_rows = meta['partitions'][-1][2]
+        index = np.memmap(os.path.join(self.root, symbol, INDEX_FILE + '.bin'), dtype=np.int64, mode='r',
+                          shape=(num_rows,))
+        return index[-1]
+
+    def _read_meta(self, symbol):
+        with open(os.path.join(self.root, symbol, META_FILE)) as f:
+            return json.load(f)
@@ -7,6 +7,14 @@ from abc import ABC, abstractmethod
 import pandas as pd
 import numpy as np
 
+from util import ewma
+
+from ._bar_kernels import BAR_FIELDS, aggregate_bars, tick_rule
+from ._readers import _file_columns, read_ticks
+
+# columns that can be added to the ohlcv bars
+EXTRA_FIELDS = ('vwap', 'ticks', 'dollar_value', 'buy_volume', 'signed_volume')
+
 
 class _BaseBars(ABC):
     """
@@ -15,110 +23,322 @@ class _BaseBars(ABC):
     they are included here so as to avoid a complicated nested class structure.
     """
 
-    def __init__(self, threshold=None, dictcol=None):
+    def __init__(self, threshold=None, dictcol=None, shared_tick=False, bars_per_day=None, num_prev_days=20,
+                 extra_fields=None):
         """
         Constructor
 
         # args
-            threshold : the sampling threshold
+            threshold : the sampling threshold, the initial guess when bars_per_day is set
             dictcol : dict that map col names to defined col names (datetime, price, volume)
+            shared_tick : if True, the closing tick of a bar is also the opening tick of the next bar,
+                          which is how the bars were built before the single-pass aggregation
+            bars_per_day : target number of bars per day, if set the threshold follows the daily activity
+            num_prev_days : ewma window, in days, of the daily activity used for the adaptive threshold
+            extra_fields : columns added to ohlcv, among EXTRA_FIELDS, 'all' for all of them
         """
         # Base properties
         self.dictcol   = dictcol
         self.threshold = threshold
+        self.shared_tick = shared_tick
+        if extra_fields == 'all':
+            extra_fields = EXTRA_FIELDS
+        self.extra_fields = tuple(extra_fields or ())
+        unknown = set(self.extra_fields) - set(EXTRA_FIELDS)
+        if unknown:
+            raise ValueError('unknown extra fields {}, expected a subset of {}'.format(sorted(unknown), EXTRA_FIELDS))
+        # adaptive threshold: activity of the current day and of the previous days, the bars with an
+        # adaptive threshold define _activity(price, volume), the sampled quantity of a set of ticks
+        if bars_per_day is not None and not hasattr(self, '_activity'):
+            raise ValueError('{} does not support bars_per_day'.format(type(self).__name__))
+        if bars_per_day is not None and threshold is None:
+            raise ValueError('bars_per_day needs a threshold for the first day')
+        self.bars_per_day  = bars_per_day
+        self.num_prev_days = num_prev_days
+        self.daily_activity = []
+        self._day = None
+        self._day_activity = 0.0
         # these two vars will be used for imbalance bar
         self.prev_tick = {}
         self.prev_tick_rule = 0
+        # accumulators of the open bar, carried between update calls
+        self._acc   = np.zeros((2, len(BAR_FIELDS)), dtype=np.float64)
+        self._flags = np.zeros(5, dtype=np.int64)
+        # tick rule state of the signed fields, [previous price, previous tick rule]
+        self._tick_state = np.array([np.nan, 0.0])
+        self._index_dtype  = None
+        self._volume_dtype = None
 
     def transform(self, df):
         """
-        Constructor
+        Build the bars of a whole dataset. The open bar and the state estimated on earlier data, such as
+        the expectations of the information bars, are reset first, so that the same data always gives
+        the same bars. The bar closed by the last boundary is returned too.
 
         # args
-            threshold : the sampling threshold
-            dictcol : dict that map col names to defined col names (datetime, price, volume)
+            df : the tick dataframe with datetime index and price, volume columns
+        # returns
+            dataframe with ohlcv values
+        """
+        ts, price, volume = self._prepare(df, self.dictcol)
+        self._reset()
+        ref_idx = self._extract_daily_bars(ts, price, volume)
+        return self._create_bars(ts, price, volume, ref_idx, final=True)
+
+    def update(self, batch):
+        """
+        Streaming version of transform: feed the ticks batch by batch, in time order. The open bar, the
+        tick rule and the expectations of the information bars are carried over between calls, and
+        only the bars completed so far are returned.
+
+        # args
+            batch : the next ticks, in the same format as for transform
+        # returns
+            dataframe with ohlcv values of the completed bars, it can be empty
+        """
+        return self._update(batch, self.dictcol)
+
+    def _update(self, batch, dictcol):
+        """
+        update on a batch whose columns are named through dictcol, None for the chunks of the readers,
+        which are already renamed to price and volume.
+        """
+        if batch.shape[0] == 0:
+            return self._create_bars(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0),
+                                     np.empty(0, dtype=np.int64), final=False)
+        ts, price, volume = self._prepare(batch, dictcol)
+        ref_idx = self._extract_daily_bars(ts, price, volume)
+        return self._create_bars(ts, price, volume, ref_idx, final=False)
+
+    def transform_file(self, file_path, batch_size=1000000, fmt=None, **kwargs):
+        """
+        Build the bars of a tick file read in chunks of ``batch_size`` rows, so that memory is
+        proportional to the batch size rather than to the file. The result equals transform on the
+        whole file.
+
+        # args
+            file_path : csv, parquet or numpy tick file, see read_ticks
+            batch_size : number of ticks read per chunk
+            fmt : 'csv', 'parquet' or 'memmap', None to use the extension
+            kwargs : passed to the reader
+        # returns
+            dataframe with ohlcv values
+        """
+        self._reset()
+        chunks = read_ticks(file_path, batch_size, self.dictcol, fmt, **kwargs)
+        bars = [self._update(batch, None) for batch in chunks]
+        bars.append(self.flush())
+        return pd.concat(bars)
+
+    def flush(self):
+        """
+        End of the stream: return the bar whose closing tick has been seen but which is still waiting
+        for a later timestamp, if any.
+        """
+        return self._create_bars(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0),
+                                 np.empty(0, dtype=np.int64), final=True)
+
+    def _prepare(self, df, dictcol=None):
+        """
+        Pull the timestamp, price and volume arrays out of the tick dataframe. The columns are found
+        through dictcol and read as views when their dtype allows it, the caller's dataframe is never
+        modified, and the arrays are only reordered when the index is not already sorted.
+
+        # args
+            df : the tick dataframe with datetime index and price, volume columns
+            dictcol : dict that map col names to defined col names, None if df already uses them
+        # returns
+            ts : np.ndarray of int64 timestamps
+            price : np.ndarray of float64
+            volume : np.ndarray of int64 or float64
+        """
+        _, price_col, volume_col = _file_columns(dictcol)
+        self._assert_csv(df, price_col, volume_col)
+        index  = pd.DatetimeIndex(df.index)
+        ts     = index.asi8
+        price  = df[price_col].to_numpy(dtype=np.float64)
+        volume = df[volume_col].to_numpy()
+        if volume.dtype != np.int64:
+            volume = volume.astype(np.float64, copy=False)
+        if not index.is_monotonic_increasing:
+            order  = np.argsort(ts, kind='stable')
+            ts, price, volume = ts[order], price[order], volume[order]
+        self._index_dtype  = index.dtype
+        self._volume_dtype = df[volume_col].dtype
+        return ts, price, volume
+
+    def _reset(self):
+        """
+        Start a new dataset: drop the open bar, and the estimators of the subclasses that have them.
         """
-        if self.dictcol != None:
-            df.rename(columns=self.dictcol, inplace=True)
-            df.drop_duplicates()
-        else:
-            df.drop_duplicates()
-        df = df[['price', 'volume']]
-        self._assert_csv(df)
-        df.sort_index(inplace=True)
-        ref_idx = self._extract_bars(df)
-        return self._create_bars(df, ref_idx)
+        self._reset_open_bar()
+
+    def _reset_open_bar(self):
+        """
+        Drop the open bar. Subclasses also reset the counters of their sampling rule here.
+        """
+        self._acc[:]   = 0
+        self._flags[:] = 0
+        self._tick_state[:] = np.nan, 0.0
+
+    def _extract_daily_bars(self, ts, price, volume):
+        """
+        Run _extract_bars day by day when the threshold is adaptive. At the start of every new day the
+        threshold becomes the ewma of the activity of the previous days divided by bars_per_day. Days
+        are the calendar days of the index, the local ones for a tz-aware index as for TimeBar.
+
+        # args
+            ts : int64 timestamps of the ticks
+            price : prices of the ticks
+            volume : volumes of the ticks
+        # returns
+            idx : np.ndarray of int64, the sorted positions of the closing tick of each bar
+        """
+        if self.bars_per_day is None:
+            return self._extract_bars(price, volume, ts)
+        day    = _days(ts, self._index_dtype)
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(day)) + 1, [ts.shape[0]]])
+        idx    = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if self._day is not None and day[start] != self._day:
+                self.daily_activity.append(self._day_activity)
+                self.daily_activity = self.daily_activity[-self.num_prev_days:]
+                self.threshold = ewma(np.array(self.daily_activity, dtype=float),
+                                      self.num_prev_days)[-1] / self.bars_per_day
+                self._day_activity = 0.0
+            self._day = day[start]
+            self._day_activity += self._activity(price[start:end], volume[start:end])
+            idx.append(self._extract_bars(price[start:end], volume[start:end], ts[start:end]) + start)
+        return np.concatenate(idx)
 
     @abstractmethod
-    def _extract_bars(self, data):
+    def _extract_bars(self, price, volume, ts=None):
         """
         This method is required by all the bar types and is used to create the desired bars.
         # args
-            data : the input data which has date as the index, which has two columns: price and volume
+            price : np.ndarray of float64, the tick prices sorted by time
+            volume : np.ndarray of int64 or float64, the tick volumes
+            ts : np.ndarray of int64, the tick timestamps, only used by the clock driven bars
         # returns
-            data : dataframe with ohlcv values, which is the ending time index
+            idx : np.ndarray of int64, the sorted positions of the closing tick of each bar, -1 for the
+                  last tick of the previous batch
         """
 
     @staticmethod
-    def _assert_csv(df):
+    def _assert_csv(df, price_col='price', volume_col='volume'):
         """
-        Tests that the csv file read has the format: date_time, price, and volume.
+        Tests that the tick data has the format: date_time index, price, and volume.
         If not then the user needs to create such a file. This format is in place to remove any unwanted overhead.
 
-        :param test_batch: (DataFrame) the first row of the dataset.
+        :param df: (DataFrame) the tick data.
+        :param price_col: (String) name of the price column.
+        :param volume_col: (String) name of the volume column.
         """
-        assert df.shape[1] == 2, 'Must have only 2 columns in csv: price, & volume.'
-        assert isinstance(df.iloc[0, :]['price'], float), 'price column in csv not float.'
-        assert not isinstance(df.iloc[0, :]['volume'], str), 'volume column in csv not int or float.'
+        assert price_col in df.columns and volume_col in df.columns, 'Must have price and volume columns.'
+        assert df[price_col].dtype.kind == 'f', 'price column not float.'
+        assert df[volume_col].dtype.kind in 'iuf', 'volume column not int or float.'
 
         try:
-            pd.to_datetime(df.index[0])
+            pd.to_datetime(df.index[:1])
         except ValueError:
-            print('the index, not a date time format:',
-                  df.index[0].iloc[0, 0])
+            print('the index, not a date time format:', df.index[0])
 
-
-    def _create_bars(self, df, sub):
+    def _create_bars(self, ts, price, volume, idx, final=True):
         """
-        fn: get ohlc from custom bars
+        fn: get ohlc from custom bars in a single pass over the ticks
+
+        By default every tick belongs to exactly one bar: a bar runs from the tick after the previous
+        closing tick to its own closing tick. With ``shared_tick`` the ticks at the previous closing
+        timestamp are counted in both neighbouring bars, as the former ``df.loc[start:end]`` slicing did.
+        In both cases a bar is indexed by the closing time of the previous bar.
 
         # args
-            df : reference pandas dataframe with all prices and volume
-            sub : datetime index
+            ts : int64 timestamps of the ticks
+            price : prices of the ticks
+            volume : volumes of the ticks
+            idx : positions of the closing ticks
+            final : close the bar of the last boundary even if more ticks with its timestamp may follow
         # returns
-            tick_df : dataframe with ohlcv values, which is the ending time index
-        """
-        ohlcv = []
-        for i in range(sub.shape[0]-1):
-            start,end         = sub[i], sub[i+1]
-            tmp_df            = df.loc[start:end]
-            max_px, min_px    = tmp_df.price.max(), tmp_df.price.min()
-            open_px, close_px = tmp_df.iloc[0].price, tmp_df.iloc[-1].price
-            vol               = tmp_df.volume.sum()
-            o, h, l, c, vol   = open_px, max_px, min_px, close_px, vol
-            ohlcv.append((start,o,h,l,c, vol))
-        cols  = ['datetime','open','high','low','close', 'volume']
-        outdf = pd.DataFrame(ohlcv,columns=cols)
-        outdf.set_index('datetime', inplace=True)
-        outdf.sort_index(inplace=True)
+            tick_df : dataframe with ohlcv values and the extra fields, which is the starting time index
+
+        The extra fields come from the same pass: ``ticks`` is the number of ticks, ``vwap`` the volume
+        weighted price, ``dollar_value`` the sum of price * volume, and ``buy_volume`` / ``signed_volume``
+        the volume of the ticks signed by the tick rule (see ``_apply_tick_rule``) carried across batches.
+        """
+        signed = 'buy_volume' in self.extra_fields or 'signed_volume' in self.extra_fields
+        label, out = self._aggregate(ts, price, volume, np.asarray(idx, dtype=np.int64), final, signed)
+        fields = dict(zip(BAR_FIELDS, out))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fields['vwap'] = fields['dollar_value'] / fields['volume']
+        fields['ticks'] = fields['ticks'].astype(np.int64)
+        outdf = pd.DataFrame(fields, index=_to_datetime_index(label, self._index_dtype))
+        outdf = outdf[['open', 'high', 'low', 'close', 'volume'] + list(self.extra_fields)]
+        if self._volume_dtype is not None:
+            for col in ('volume', 'buy_volume', 'signed_volume'):
+                if col in outdf:
+                    outdf[col] = outdf[col].astype(self._volume_dtype)
         return outdf
 
+    def _aggregate(self, ts, price, volume, idx, final, signed):
+        """
+        The single pass behind _create_bars, see aggregate_bars. Returns the int64 labels and the
+        BAR_FIELDS x bars columns.
+        """
+        return aggregate_bars(ts, price, volume, idx, self.shared_tick, final, self._acc, self._flags, signed,
+                              self._tick_state)
+
     def _apply_tick_rule(self, price):
         """
         Applies the tick rule as defined on page 29.
 
-        :param price: Price at time t
-        :return: The signed tick
-        """
-        if self.prev_tick:
-            tick_diff = price - self.prev_tick['price']
-        else:
-            tick_diff = 0
-        signed_tick = 0
-        if tick_diff != 0:
-            signed_tick = np.sign(tick_diff)
-            self.prev_tick_rule = signed_tick
-        else:
-            signed_tick = self.prev_tick_rule
-
-        return signed_tick
\ No newline at end of file
+        :param price: Price at time t, or an array of prices (see tick_rule)
+        :return: The signed tick, or the array of signed ticks
+        """
+        signs, (_, self.prev_tick_rule) = tick_rule(np.atleast_1d(price), self.prev_tick.get('price', np.nan),
+                                                    self.prev_tick_rule)
+        if np.ndim(price) == 0:
+            return signs[0]
+        return signs
+
+
+def _ts_units(delta, dtype):
+    """
+    Length of a duration, a pd.Timedelta or a string like '5min', in the unit of the int64 timestamps of
+    a datetime index dtype.
+    """
+    if dtype is None:
+        unit = 'ns'
+    elif isinstance(dtype, pd.DatetimeTZDtype):
+        unit = dtype.unit
+    else:
+        unit = np.datetime_data(dtype)[0]
+    return int(pd.Timedelta(delta) // pd.Timedelta(1, unit=unit))
+
+
+def _wall_clock(ts, dtype):
+    """
+    Local wall clock of the int64 timestamps of a tz-aware index, as naive int64 timestamps.
+    """
+    index = pd.DatetimeIndex(ts.view('M8[{}]'.format(dtype.unit))).tz_localize('UTC').tz_convert(dtype.tz)
+    return index.tz_localize(None).as_unit(dtype.unit).asi8
+
+
+def _days(ts, dtype):
+    """
+    Calendar day numbers of int64 timestamps, the local date for a tz-aware index.
+    """
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        ts = _wall_clock(ts, dtype)
+    return ts // _ts_units('1D', dtype)
+
+
+def _to_datetime_index(label, dtype):
+    """
+    Turn the int64 timestamps returned by the kernels back into a DatetimeIndex of the input dtype.
+    """
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        index = pd.DatetimeIndex(label.view('M8[{}]'.format(dtype.unit))).tz_localize('UTC').tz_convert(dtype.tz)
+    else:
+        index = pd.DatetimeIndex(label.view(dtype if dtype is not None else 'M8[ns]'))
+    index.name = 'datetime'
+    return index
@@ -0,0 +1,68 @@
+"""
+Activity bars with a maximum duration, so that the bars of illiquid periods do not stay open for hours.
+"""
+
+
+import numpy as np
+from ._base_bars import _BaseBars, _ts_units
+from ._bar_kernels import hybrid_boundaries
+
+class HybridBar(_BaseBars):
+    """
+    A bar closes when the number of ticks, the volume or the dollar value since its opening tick reaches
+    the threshold, or when a tick arrives max_elapsed or more after its opening tick. In the second case
+    the bar closes on the previous tick and the late tick opens the next bar.
+    """
+
+    def __init__(self, threshold=None, max_elapsed='1h', mode='volume', dictcol=None, shared_tick=False,
+                 bars_per_day=None, num_prev_days=20, extra_fields=None):
+        """
+        Constructor
+
+        # args
+            threshold : the sampling threshold of the activity, the initial guess when bars_per_day is set
+            max_elapsed : the longest duration of a bar, such as '30min'
+            mode: it can be tick, or volume or dollar
+            dictcol : dict that map col names to defined col names (datetime, price, volume)
+            shared_tick : count the closing tick of a bar in the next bar too, see _BaseBars
+            bars_per_day : target number of bars per day of the adaptive threshold, see _BaseBars
+            num_prev_days : ewma window, in days, of the adaptive threshold
+            extra_fields : columns added to ohlcv, see _BaseBars
+        """
+        if mode not in ('tick', 'volume', 'dollar'):
+            raise ValueError("mode should be one of ['tick', 'volume', 'dollar']")
+        _BaseBars.__init__(self, threshold, dictcol, shared_tick, bars_per_day, num_prev_days, extra_fields)
+        self.max_elapsed = max_elapsed
+        self.mode = mode
+        # running activity, and [opening timestamp, has open bar] of the open bar
+        self._cum_activity = np.zeros(1)
+        self._clock = np.zeros(2, dtype=np.int64)
+
+    def _reset_open_bar(self):
+        _BaseBars._reset_open_bar(self)
+        self._cum_activity[:] = 0
+        self._clock[:] = 0
+
+    def _tick_activity(self, price, volume):
+        if self.mode == 'tick':
+            return np.ones(price.shape[0])
+        if self.mode == 'volume':
+            return volume.astype(np.float64, copy=False)
+        return price * volume
+
+    def _activity(self, price, volume):
+        return float(self._tick_activity(price, volume).sum())
+
+    def _extract_bars(self, price, volume, ts=None):
+        """
+        method that extract the index of rows for sampling
+        # args
+            price : the prices of the ticks sorted by time
+            volume : the volumes of the ticks
+            ts : the int64 timestamps of the ticks
+        # return:
+            the positions of the boundary tick for each sample interval, -1 for the last tick of the
+            previous batch
+        """
+        return hybrid_boundaries(self._tick_activity(price, volume), ts, float(self.threshold),
+                                 _ts_units(self.max_elapsed, self._index_dtype), self._cum_activity, self._clock)
@@ -7,7 +7,7 @@ duplicated code.
 import pandas as pd
 import numpy as np
 from ._base_bars import _BaseBars
-from util import ewma
+from ._bar_kernels import IMBALANCE_METRICS, run_boundaries
 
 class Imbalance_Run_Bar(_BaseBars):
     """
@@ -16,7 +16,8 @@ class Imbalance_Run_Bar(_BaseBars):
     they are included here so as to avoid a complicated nested class structure.
     """
 
-    def __init__(self, threshold=None, dictcol=None, mode='tick', num_prev_bars=3, exp_num_ticks_init=5000):
+    def __init__(self, threshold=None, dictcol=None, mode='tick', num_prev_bars=3, exp_num_ticks_init=5000,
+                 shared_tick=False, buffer_size=1000000, extra_fields=None):
         """
         Constructor
 
@@ -26,125 +27,70 @@ class Imbalance_Run_Bar(_BaseBars):
             mode: it can be tick, or volume or dollar
             num_prev_bars: how many previous bars are checked for expectation
             exp_num_ticks_init: the inital guess of expectation of sampled information
+            shared_tick: count the closing tick of a bar in the next bar too, see _BaseBars
+            buffer_size: how many past imbalances are kept per side for the expected imbalances, the ewma
+                         window is capped at this size so that memory stays constant
+            extra_fields: columns added to ohlcv, see _BaseBars
         """
+        if mode not in IMBALANCE_METRICS:
+            raise ValueError('mode should be one of {}'.format(list(IMBALANCE_METRICS)))
         # Base properties
-        _BaseBars.__init__(self, threshold, dictcol)
+        _BaseBars.__init__(self, threshold, dictcol, shared_tick, extra_fields=extra_fields)
         # Information bar properties
         self.num_prev_bars = num_prev_bars
         self.exp_num_ticks_init = exp_num_ticks_init
         # Expected number of ticks extracted from prev bars
         self.exp_num_ticks = self.exp_num_ticks_init
-        self.num_ticks_bar = {'cum_ticks':      [], # List of number of ticks from previous bars
-                              'buy_proportion': []} # List of number of buy ticks from previous bars
         self.exp_buy_proportion = np.nan
         self.expected_imbalance = {'L': np.nan, 'S': np.nan}
-        self.imbalance_array = {'L': [], 'S': []}
         self.metric  = mode
+        # ring buffers of the recent buy and sell imbalances
+        buffer_size = max(buffer_size, exp_num_ticks_init)
+        self.imbalance_buffer = {'L': np.zeros(buffer_size, dtype=np.float64),
+                                 'S': np.zeros(buffer_size, dtype=np.float64)}
+        # ring buffer of the number of ticks (row 0) and the buy proportion (row 1) of the previous bars
+        self.num_ticks_buffer = np.zeros((2, num_prev_bars), dtype=np.float64)
+        # [prev_price, prev_tick_rule, num_buy, num_sell, num_bars, exp_num_ticks, exp_buy_proportion,
+        #  expected_imbalance L, expected_imbalance S, cum_ticks, buy_ticks, cum_theta_buy, cum_theta_sell],
+        # carried between calls by the compiled state machine
+        self._state = np.array([np.nan, 0, 0, 0, 0, self.exp_num_ticks, np.nan, np.nan, np.nan, 0, 0, 0, 0],
+                               dtype=np.float64)
 
-    def _extract_bars(self, inputdf):
+    def _reset(self):
+        _BaseBars._reset(self)
+        # a new dataset starts from the initial expectations, with empty ring buffers
+        self._state[:] = np.nan, 0, 0, 0, 0, self.exp_num_ticks_init, np.nan, np.nan, np.nan, 0, 0, 0, 0
+        self.imbalance_buffer['L'][:] = 0
+        self.imbalance_buffer['S'][:] = 0
+        self.num_ticks_buffer[:] = 0
+        self.exp_num_ticks      = self.exp_num_ticks_init
+        self.exp_buy_proportion = np.nan
+        self.expected_imbalance = {'L': np.nan, 'S': np.nan}
+        self.prev_tick      = {}
+        self.prev_tick_rule = 0
+
+    def _reset_open_bar(self):
+        _BaseBars._reset_open_bar(self)
+        # the expectations are kept, only the counters of the open bar are reset, see _reset
+        self._state[9:13] = 0
+
+    def _extract_bars(self, price, volume, ts=None):
         """
         method that extract the index of rows for sampling
         # args
-            inputdf : the dataframe that has three columns price, volume and datetime
+            price : the prices of the ticks sorted by time
+            volume : the volumes of the ticks
+            ts : the timestamps of the ticks, not used
         # return:
-            the dataframe only containing the boundary datetime for each sample interval
-        """
-        df_used = inputdf.copy()
-        df_used = df_used[['price', 'volume']]
-        idx     = []
-        cum_ticks = 0
-        cum_theta_buy = 0
-        buy_ticks = 0
-        cum_theta_sell = 0
-        for i in range(df_used.shape[0]):
-            dfrow  = df_used.iloc[i,:]
-            price  = dfrow.price
-            volume = dfrow.volume
-            cum_ticks += 1
-            signed_tick = self._apply_tick_rule(price)
-            imbalance   = self._get_imbalance(price, signed_tick, volume)
-
-            if imbalance > 0:
-                self.imbalance_array['L'].append(imbalance)
-                cum_theta_buy += imbalance
-                buy_ticks += 1
-            elif imbalance < 0:
-                self.imbalance_array['S'].append(np.abs(imbalance))
-                cum_theta_sell +=  np.abs(imbalance)
-            imbalances_are_counted_flag = np.isnan([self.expected_imbalance['L'],
-                                                    self.expected_imbalance['S']]).any()
-            if not idx and imbalances_are_counted_flag:
-                self.expected_imbalance['L'] = self._get_expected_imbalance(self.exp_num_ticks,
-                                                                            self.imbalance_array['L'])
-                self.expected_imbalance['S'] = self._get_expected_imbalance(self.exp_num_ticks,
-                                                                            self.imbalance_array['S'])
-                if bool(np.isnan([self.expected_imbalance['L'], self.expected_imbalance['S']]).any()) is False:
-                    self.exp_buy_proportion = buy_ticks / cum_ticks
-                    cum_theta_buy, cum_theta_sell = 0, 0  # reset theta after warm-up period
-                    self.warm_up = False
-            max_proportion = max(self.expected_imbalance['L'] * self.exp_buy_proportion,
-                                 self.expected_imbalance['S'] * (1 - self.exp_buy_proportion))
-            if max(cum_theta_buy, cum_theta_sell) > self.exp_num_ticks * max_proportion and self.warm_up is False:
-                self.num_ticks_bar['cum_ticks'].append(cum_ticks)
-                self.num_ticks_bar['buy_proportion'].append(buy_ticks / cum_ticks)
-                # Expected number of ticks based on formed bars
-                self.exp_num_ticks = ewma(np.array(self.num_ticks_bar['cum_ticks'][-self.num_prev_bars:], dtype=float),
-                                          self.num_prev_bars)[-1]
-                # Expected buy ticks proportion based on formed bars
-                self.exp_buy_ticks_proportion = \
-                    ewma(np.array(self.num_ticks_bar['buy_proportion'][-self.num_prev_bars:], dtype=float),
-                         self.num_prev_bars)[-1]
-                self.expected_imbalance['L'] = self._get_expected_imbalance(self.exp_num_ticks * self.num_prev_bars,
-                                                                            self.imbalance_array['L'])
-                self.expected_imbalance['S'] = self._get_expected_imbalance(self.exp_num_ticks * self.num_prev_bars,
-                                                                            self.imbalance_array['S'])
-                idx.append(i)
-                # Reset counters
-                cum_ticks, buy_ticks, cum_theta_buy, cum_theta_sell = 0, 0, 0, 0
-                self.prev_tick['price'] = price
-                continue
-            self.prev_tick['price'] = price
-        return inputdf.iloc[idx,:].index.drop_duplicates()
-
-    def _get_expected_imbalance(self, window, imbalance_array):
-        """
-        Calculate the expected imbalance: 2P[b_t=1]-1, using a EWMA, pg 29
-        :param window: EWMA window for calculation
-        :param imbalance_array: (numpy array) of the tick imbalances
-        :return: expected_imbalance: 2P[b_t=1]-1, approximated using a EWMA
-        """
-        if len(imbalance_array) < self.exp_num_ticks_init:
-            # Waiting for array to fill for ewma
-            ewma_window = np.nan
-        else:
-            # ewma window can be either the window specified in a function call
-            # or it is len of imbalance_array if window > len(imbalance_array)
-            ewma_window = int(min(len(imbalance_array), window))
-
-        if np.isnan(ewma_window):
-            # return nan, wait until len(imbalance_array) >= self.exp_num_ticks_init
-            expected_imbalance = np.nan
-        else:
-            expected_imbalance = ewma(
-                np.array(imbalance_array[-ewma_window:], dtype=float), window=ewma_window)[-1]
-
-        return expected_imbalance
-
-    def _get_imbalance(self, price, signed_tick, volume):
-        """
-        Get the imbalance at a point in time, denoted as Theta_t in the book, pg 29.
-
-        :param price: Price at t
-        :param signed_tick: signed tick, using the tick rule
-        :param volume: Volume traded at t
-        :return: Imbalance at time t
+            the positions of the boundary tick for each sample interval
         """
-        if self.metric == 'tick':
-            imbalance = signed_tick
-        if self.metric == 'dollar':
-            imbalance = signed_tick * volume * price
-        if self.metric == 'volume':
-            imbalance = signed_tick * volume
-        else:
-            imbalance = signed_tick
-        return imbalance
\ No newline at end of file
+        idx = run_boundaries(price, volume, IMBALANCE_METRICS[self.metric], self.exp_num_ticks_init,
+                             self._state, self.imbalance_buffer['L'], self.imbalance_buffer['S'],
+                             self.num_ticks_buffer)
+        if price.shape[0] > 0:
+            self.prev_tick['price'] = self._state[0]
+        self.prev_tick_rule     = self._state[1]
+        self.exp_num_ticks      = self._state[5]
+        self.exp_buy_proportion = self._state[6]
+        self.expected_imbalance = {'L': self._state[7], 'S': self._state[8]}
+        return idx
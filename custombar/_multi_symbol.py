@@ -0,0 +1,70 @@
+"""
+Bars of many symbols at once. The symbols are split into molecules with util.multiprocess and every
+molecule is built in its own process, each job only carries the tick sources of its own symbols.
+"""
+
+import pandas as pd
+
+from util.multiprocess import lin_parts, process_jobs, process_jobs_
+
+
+def _bars_for_symbols(sources, bar_class, bar_kwargs, batch_size):
+    """
+    Build the bars of a molecule of symbols.
+
+    # args
+        sources : dict symbol -> tick dataframe or tick file path
+        bar_class : one of the bar classes, e.g. TickBar
+        bar_kwargs : dict of the constructor arguments of bar_class
+        batch_size : number of ticks read per chunk for file sources
+    # returns
+        dict symbol -> dataframe of bars
+    """
+    out = {}
+    for symbol, source in sources.items():
+        bars = bar_class(**bar_kwargs)
+        if isinstance(source, pd.DataFrame):
+            out[symbol] = bars.transform(source)
+        else:
+            out[symbol] = bars.transform_file(source, batch_size=batch_size)
+    return out
+
+
+def build_bars(sources, bar_class, num_threads=24, mp_batches=1, long_format=True, batch_size=1000000,
+               **bar_kwargs):
+    """
+    Build the bars of every symbol of a universe in parallel processes.
+
+    # args
+        sources : dict symbol -> tick dataframe or tick file path (csv, parquet or numpy, see read_ticks)
+        bar_class : one of the bar classes, e.g. TickBar; a new instance is used for every symbol
+        num_threads : number of processes, 1 runs sequentially for debugging
+        mp_batches : number of molecules per process, more molecules balance symbols of uneven size
+        long_format : if True, return one dataframe indexed by (symbol, datetime), else a dict of frames
+        batch_size : number of ticks read per chunk for file sources
+        bar_kwargs : the constructor arguments of bar_class, e.g. threshold
+    # returns
+        dataframe of bars indexed by (symbol, datetime), or dict symbol -> dataframe of bars
+    """
+    symbols = list(sources)
+    if not symbols:
+        raise ValueError('sources should map at least one symbol to its ticks')
+    parts   = lin_parts(len(symbols), num_threads * mp_batches)
+    jobs    = []
+    for i in range(1, len(parts)):
+        molecule = symbols[parts[i - 1]:parts[i]]
+        jobs.append({'func': _bars_for_symbols, 'sources': {s: sources[s] for s in molecule},
+                     'bar_class': bar_class, 'bar_kwargs': bar_kwargs, 'batch_size': batch_size})
+
+    if num_threads == 1:
+        out = process_jobs_(jobs)
+    else:
+        out = process_jobs(jobs, num_threads=num_threads)
+
+    bars = {}
+    for molecule_bars in out:
+        bars.update(molecule_bars)
+    bars = {symbol: bars[symbol] for symbol in symbols}
+    if not long_format:
+        return bars
+    return pd.concat(bars, names=['symbol'])
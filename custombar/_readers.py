@@ -0,0 +1,119 @@
+"""
+Chunked readers of raw tick files. Every reader yields dataframes of at most ``chunk_size`` ticks with
+a datetime index and typed price and volume columns, which can be fed to the update method of the bars.
+Only the datetime, price and volume columns are read from the file.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+TICK_COLUMNS = ('datetime', 'price', 'volume')
+
+
+def _file_columns(dictcol):
+    """
+    Names of the datetime, price and volume columns in the file, given the dictcol of the bars.
+    """
+    names = {v: k for k, v in (dictcol or {}).items()}
+    return [names.get(col, col) for col in TICK_COLUMNS]
+
+
+def _to_frame(ts, price, volume):
+    index = pd.DatetimeIndex(ts, name='datetime')
+    return pd.DataFrame({'price': price, 'volume': volume}, index=index, copy=False)
+
+
+def read_csv_ticks(file_path, chunk_size=1000000, dictcol=None, volume_dtype=None):
+    """
+    Read a csv tick file chunk by chunk.
+
+    # args
+        file_path : path to the csv file
+        chunk_size : number of ticks per chunk
+        dictcol : dict that map col names to defined col names (datetime, price, volume)
+        volume_dtype : dtype of the volume column, float64 or int64, None to keep the type read from the file
+    # yields
+        dataframe with datetime index, price and volume columns
+    """
+    dt_col, px_col, vol_col = _file_columns(dictcol)
+    dtype = {px_col: np.float64}
+    if volume_dtype is not None:
+        dtype[vol_col] = volume_dtype
+    reader = pd.read_csv(file_path, usecols=[dt_col, px_col, vol_col], chunksize=chunk_size, dtype=dtype)
+    for chunk in reader:
+        yield _to_frame(pd.to_datetime(chunk[dt_col].to_numpy()), chunk[px_col].to_numpy(),
+                        chunk[vol_col].to_numpy())
+
+
+def read_parquet_ticks(file_path, chunk_size=1000000, dictcol=None):
+    """
+    Read a parquet tick file chunk by chunk, the columns keep their parquet types. Needs pyarrow.
+
+    # args
+        file_path : path to the parquet file
+        chunk_size : number of ticks per chunk
+        dictcol : dict that map col names to defined col names (datetime, price, volume)
+    # yields
+        dataframe with datetime index, price and volume columns
+    """
+    import pyarrow.parquet as pq
+
+    dt_col, px_col, vol_col = _file_columns(dictcol)
+    parquet_file = pq.ParquetFile(file_path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=[dt_col, px_col, vol_col]):
+        yield _to_frame(batch.column(dt_col).to_numpy(zero_copy_only=False),
+                        batch.column(px_col).to_numpy(zero_copy_only=False),
+                        batch.column(vol_col).to_numpy(zero_copy_only=False))
+
+
+def read_memmap_ticks(file_path, chunk_size=1000000, dictcol=None, dtype=None):
+    """
+    Read a numpy tick file through a memory map. The file holds records with an int64 nanosecond
+    timestamp, a float64 price and a volume, either as a .npy structured array or, when ``dtype`` is
+    given, as raw binary records.
+
+    # args
+        file_path : path to the .npy or raw binary file
+        chunk_size : number of ticks per chunk
+        dictcol : dict that map field names to defined col names (datetime, price, volume)
+        dtype : numpy structured dtype of the raw records, None for a .npy file
+    # yields
+        dataframe with datetime index, price and volume columns
+    """
+    if dtype is None:
+        records = np.load(file_path, mmap_mode='r')
+    else:
+        records = np.memmap(file_path, dtype=dtype, mode='r')
+    dt_col, px_col, vol_col = _file_columns(dictcol)
+    for start in range(0, records.shape[0], chunk_size):
+        chunk = records[start:start + chunk_size]
+        yield _to_frame(chunk[dt_col].astype(np.int64).view('M8[ns]'), chunk[px_col].astype(np.float64),
+                        np.array(chunk[vol_col]))
+
+
+def read_ticks(file_path, chunk_size=1000000, dictcol=None, fmt=None, **kwargs):
+    """
+    Read a tick file chunk by chunk, the reader is picked from ``fmt`` or from the file extension.
+
+    # args
+        file_path : path to the tick file
+        chunk_size : number of ticks per chunk
+        dictcol : dict that map col names to defined col names (datetime, price, volume)
+        fmt : 'csv', 'parquet' or 'memmap', None to use the extension
+        kwargs : passed to the reader
+    # yields
+        dataframe with datetime index, price and volume columns
+    """
+    if fmt is None:
+        path = os.fspath(file_path)
+        # a compressed csv keeps the extension of the file it compresses
+        if path.lower().endswith('.gz'):
+            path = path[:-len('.gz')]
+        ext = os.path.splitext(path)[1].lower()
+        fmt = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet'}.get(ext, 'memmap')
+    readers = {'csv': read_csv_ticks, 'parquet': read_parquet_ticks, 'memmap': read_memmap_ticks}
+    if fmt not in readers:
+        raise ValueError('fmt should be one of {}'.format(list(readers)))
+    return readers[fmt](file_path, chunk_size=chunk_size, dictcol=dictcol, **kwargs)
@@ -0,0 +1,65 @@
+"""
+Time bars built by the single-pass aggregation shared with the other bar types.
+"""
+
+
+import numpy as np
+import pandas as pd
+
+from ._base_bars import _BaseBars, _ts_units, _wall_clock
+from ._bar_kernels import aggregate_time_bars
+
+
+class TimeBar(_BaseBars):
+    """
+    Bars of fixed clock intervals, the tick level counterpart of util.sample_df. A bar is labelled by the
+    start of its interval and intervals without ticks give no bar.
+    """
+
+    def __init__(self, freq='1min', dictcol=None, extra_fields=None):
+        """
+        Constructor
+
+        # args
+            freq : length of the intervals, a fixed duration such as '5s', '1min' or '1h'. As for resample,
+                   the intervals start at midnight of the first day, local midnight for a tz-aware index,
+                   and whole days are the calendar days of its time zone
+            dictcol : dict that map col names to defined col names (datetime, price, volume)
+            extra_fields : columns added to ohlcv, see _BaseBars
+        """
+        _BaseBars.__init__(self, None, dictcol, extra_fields=extra_fields)
+        self.freq = freq
+        # start of the first interval, set by the first tick
+        self._origin = None
+
+    def _reset_open_bar(self):
+        _BaseBars._reset_open_bar(self)
+        self._origin = None
+
+    def _extract_bars(self, price, volume, ts=None):
+        """
+        Time bars close on the clock rather than on a tick, see _aggregate.
+        """
+        return np.empty(0, dtype=np.int64)
+
+    def _aggregate(self, ts, price, volume, idx, final, signed):
+        dtype = self._index_dtype
+        freq  = _ts_units(self.freq, dtype)
+        day   = _ts_units('1D', dtype)
+        # the intervals of a tz-aware index start at local midnight, and whole days are calendar days
+        # of the local wall clock, as for resample
+        local = isinstance(dtype, pd.DatetimeTZDtype)
+        calendar = local and freq % day == 0
+        clock = _wall_clock(ts, dtype) if calendar else ts
+        if self._origin is None and ts.shape[0] > 0:
+            first = _wall_clock(ts[:1], dtype)[0] if local else ts[0]
+            self._origin = int(first - first % day)
+            if local and not calendar:
+                # local midnight on the absolute clock
+                self._origin += int(ts[0] - first)
+        labels, out = aggregate_time_bars(clock, price, volume, freq, self._origin or 0, final, self._acc,
+                                          self._flags, signed, self._tick_state)
+        if calendar and labels.shape[0] > 0:
+            labels = pd.DatetimeIndex(labels.view('M8[{}]'.format(dtype.unit))).tz_localize(
+                dtype.tz, nonexistent='shift_forward').tz_convert('UTC').as_unit(dtype.unit).asi8
+        return labels, out
@@ -7,6 +7,7 @@ duplicated code.
 import pandas as pd
 import numpy as np
 from ._base_bars import _BaseBars
+from ._bar_kernels import cumsum_boundaries
 
 class VolBar(_BaseBars):
     """
@@ -15,32 +16,40 @@ class VolBar(_BaseBars):
     they are included here so as to avoid a complicated nested class structure.
     """
 
-    def __init__(self, threshold=None, dictcol=None):
+    def __init__(self, threshold=None, dictcol=None, shared_tick=False, bars_per_day=None, num_prev_days=20,
+                 extra_fields=None):
         """
         Constructor
 
+        :param threshold: (Float) sampling threshold, the initial guess when bars_per_day is set.
+        :param bars_per_day: (Int) target number of bars per day, the threshold then follows the ewma of the
+                             daily activity over num_prev_days days.
+        :param extra_fields: (Tuple) columns added to ohlcv, among vwap, ticks, dollar_value, buy_volume and
+                             signed_volume, or 'all'.
+
         :param file_path: (String) Path to the csv file containing raw tick data in the format[date_time, price, volume]
         :param metric: (String) type of imbalance bar to create. Example: dollar_imbalance.
         :param batch_size: (Int) Number of rows to read in from the csv, per batch.
         """
         # Base properties
-        _BaseBars.__init__(self, threshold, dictcol)
+        _BaseBars.__init__(self, threshold, dictcol, shared_tick, bars_per_day, num_prev_days, extra_fields)
+        # sampled quantity of the open bar, carried between update calls
+        self._cum_volume = 0.0
 
+    def _reset_open_bar(self):
+        _BaseBars._reset_open_bar(self)
+        self._cum_volume = 0.0
 
+    def _activity(self, price, volume):
+        return float(volume.sum())
 
-    def _extract_bars(self, inputdf):
+    def _extract_bars(self, price, volume, ts=None):
         """
         This method is required by all the bar types and is used to create the desired bars.
-        :param data: (DataFrame) Contains 3 columns - date_time, price, and volume.
-        :return: return datetimeIndex
+        :param price: (np.ndarray) prices of the ticks sorted by time.
+        :param volume: (np.ndarray) volumes of the ticks.
+        :param ts: (np.ndarray) timestamps of the ticks, not used.
+        :return: (np.ndarray) positions of the closing tick of each bar.
         """
-        t_vol = inputdf['volume']
-        ts      = 0
-        idx     = []
-        for i, x in enumerate(t_vol):
-            ts += x
-            if ts >= self.threshold:
-                idx.append(i)
-                ts = 0
-                continue
-        return inputdf.iloc[idx,:].index.drop_duplicates()
+        idx, self._cum_volume = cumsum_boundaries(volume, float(self.threshold), self._cum_volume)
+        return idx
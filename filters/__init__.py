@@ -1,5 +1,6 @@
 """
 packages that we use the cusum_filter and z_score+filter
 """
-from .filters import cusum_filter, z_score_filter
-from .adv_filters import emd_filter, wvlet_filter, smooth_algo
\ No newline at end of file
+from .filters import cusum_filter, z_score_filter, CusumFilter, cusum_filter_2d, z_score_filter_2d, ZScoreFilter
+from .adv_filters import emd_filter, wvlet_filter, smooth_algo, WaveletDenoiser, \
+    EMDCache, emd_batch, emd_filter_batch
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+Compiled kernels of the event filters. Every kernel works on plain numpy arrays and returns positions,
+the filters map them back to the index of the input series.
+"""
+
+import numpy as np
+from numba import jit, prange
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def cusum_positions(log_ret, threshold, state):
+    """
+    Symmetric CUSUM filter (pg 39) over log returns. The sums are reset to zero after an event, and a nan
+    return resets both of them, as max(0.0, nan) did in the python loop.
+
+    :args
+    1. log_ret: (np.ndarray), (float64) the log returns
+    2. threshold: (np.ndarray), (float64) the threshold of each return, nan for no event
+    3. state: (np.ndarray), (float64) [s_pos, s_neg] carried between calls, updated in place
+
+    :return
+    (np.ndarray) (int64) the positions of the returns that trigger an event
+    """
+    s_pos, s_neg = state[0], state[1]
+    idx = np.empty(log_ret.shape[0], dtype=np.int64)
+    num = 0
+    for i in range(log_ret.shape[0]):
+        pos = s_pos + log_ret[i]
+        neg = s_neg + log_ret[i]
+        s_pos = pos if pos > 0.0 else 0.0
+        s_neg = neg if neg < 0.0 else 0.0
+        if s_neg < -threshold[i]:
+            s_neg = 0.0
+            idx[num] = i
+            num += 1
+        elif s_pos > threshold[i]:
+            s_pos = 0.0
+            idx[num] = i
+            num += 1
+    state[0], state[1] = s_pos, s_neg
+    return idx[:num]
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _cusum_column(prices, threshold, col, out, start):
+    """
+    CUSUM filter of one column of a price matrix, see cusum_positions. Writes the row positions of the
+    events in ``out`` from ``start`` if ``out`` is not empty, and returns the number of events.
+    """
+    s_pos, s_neg = 0.0, 0.0
+    num = 0
+    prev = np.log(prices[0, col]) if prices.shape[0] > 0 else 0.0
+    for i in range(1, prices.shape[0]):
+        log_price = np.log(prices[i, col])
+        log_ret = log_price - prev
+        prev = log_price
+        pos = s_pos + log_ret
+        neg = s_neg + log_ret
+        s_pos = pos if pos > 0.0 else 0.0
+        s_neg = neg if neg < 0.0 else 0.0
+        event = False
+        if s_neg < -threshold[i, col]:
+            s_neg = 0.0
+            event = True
+        elif s_pos > threshold[i, col]:
+            s_pos = 0.0
+            event = True
+        if event:
+            if out.shape[0] > 0:
+                out[start + num] = i
+            num += 1
+    return num
+
+
+@jit(nopython=True, nogil=True, cache=True, parallel=True)
+def cusum_positions_2d(prices, threshold):
+    """
+    CUSUM filter of every column of a time x assets price matrix, the columns run in parallel. The events
+    are counted in a first pass and written in a second pass, so that the output is exactly sized.
+
+    :args
+    1. prices: (np.ndarray), (float64) time x assets prices
+    2. threshold: (np.ndarray), (float64) time x assets thresholds, nan for no event
+
+    :return
+    (tuple) np.ndarray (int64) of the offsets of each asset in the positions, with assets + 1 entries, and
+    np.ndarray (int64) of the row positions of the events, asset after asset
+    """
+    num_assets = prices.shape[1]
+    counts = np.zeros(num_assets, dtype=np.int64)
+    empty  = np.empty(0, dtype=np.int64)
+    for col in prange(num_assets):
+        counts[col] = _cusum_column(prices, threshold, col, empty, 0)
+    offsets = np.zeros(num_assets + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    positions = np.empty(offsets[-1], dtype=np.int64)
+    for col in prange(num_assets):
+        _cusum_column(prices, threshold, col, positions, offsets[col])
+    return offsets, positions
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _welford_add(n, mean, m2, value):
+    n += 1
+    delta = value - mean
+    mean += delta / n
+    m2 += delta * (value - mean)
+    return n, mean, m2
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _welford_remove(n, mean, m2, value):
+    n -= 1
+    if n == 0:
+        return 0.0, 0.0, 0.0
+    delta = value - mean
+    mean -= delta / n
+    m2 -= delta * (value - mean)
+    return n, mean, max(m2, 0.0)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _zscore_column(values, col, mean_window, std_window, z_score, side, buf, state, count, out_pos, out_side,
+                   start):
+    """
+    Rolling z-score events of one column, see zscore_positions_2d. ``buf`` is the ring buffer of the
+    column and ``state`` its [n, mean, nan count] of the mean window and [n, mean, m2, nan count] of the
+    std window, both updated in place. The events are written from ``start`` if ``out_pos`` is not empty.
+    """
+    size = buf.shape[0]
+    n_m, mean_m, nan_m = state[0], state[1], state[2]
+    n_s, mean_s, m2_s, nan_s = state[3], state[4], state[5], state[6]
+    num = 0
+    for i in range(values.shape[0]):
+        value = values[i, col]
+        # the values that leave the windows, read before the ring buffer is overwritten
+        if count >= mean_window:
+            old = buf[(count - mean_window) % size]
+            if np.isnan(old):
+                nan_m -= 1
+            else:
+                n_m, mean_m, _ = _welford_remove(n_m, mean_m, 0.0, old)
+        if count >= std_window:
+            old = buf[(count - std_window) % size]
+            if np.isnan(old):
+                nan_s -= 1
+            else:
+                n_s, mean_s, m2_s = _welford_remove(n_s, mean_s, m2_s, old)
+        buf[count % size] = value
+        count += 1
+        if np.isnan(value):
+            nan_m += 1
+            nan_s += 1
+            continue
+        n_m, mean_m, _ = _welford_add(n_m, mean_m, 0.0, value)
+        n_s, mean_s, m2_s = _welford_add(n_s, mean_s, m2_s, value)
+        # a full window without nan, as pandas rolling requires
+        if count < mean_window or count < std_window or std_window < 2 or nan_m > 0 or nan_s > 0:
+            continue
+        band = z_score * np.sqrt(m2_s / (std_window - 1))
+        sign = 0
+        if side >= 0 and value >= mean_m + band:
+            sign = 1
+        elif side <= 0 and value <= mean_m - band:
+            sign = -1
+        if sign != 0:
+            if out_pos.shape[0] > 0:
+                out_pos[start + num] = i
+                out_side[start + num] = sign
+            num += 1
+    state[0], state[1], state[2] = n_m, mean_m, nan_m
+    state[3], state[4], state[5], state[6] = n_s, mean_s, m2_s, nan_s
+    return num
+
+
+@jit(nopython=True, nogil=True, cache=True, parallel=True)
+def zscore_positions_2d(values, mean_window, std_window, z_score, side, buf, state, count):
+    """
+    Single-pass rolling z-score filter of every column of a time x assets matrix. The rolling mean and
+    standard deviation (ddof=1) are updated with Welford's add / remove steps, and an event is a value at
+    or above mean + z_score * std (side 1), at or below mean - z_score * std (side -1), or either (side 0).
+    The windows are carried in ``buf``, ``state`` and ``count`` so that the matrix can be fed in batches.
+
+    :args
+    1. values: (np.ndarray), (float64) time x assets values
+    2. mean_window: (int) window of the rolling mean
+    3. std_window: (int) window of the rolling standard deviation
+    4. z_score: (float) number of standard deviations of an event
+    5. side: (int) 1 for the upper tail, -1 for the lower tail, 0 for both
+    6. buf: (np.ndarray), (float64) assets x max(mean_window, std_window) ring buffers of the last values
+    7. state: (np.ndarray), (float64) assets x 7 moments of the windows, zeros at the start
+    8. count: (np.ndarray), (int64) [number of rows seen], updated in place
+
+    :return
+    (tuple) np.ndarray (int64) of the offsets of each asset, with assets + 1 entries, np.ndarray (int64) of
+    the row positions of the events, asset after asset, and np.ndarray (int64) of their side, 1 or -1
+    """
+    num_assets = values.shape[1]
+    counts = np.zeros(num_assets, dtype=np.int64)
+    empty  = np.empty(0, dtype=np.int64)
+    # counting pass on copies of the window state
+    for col in prange(num_assets):
+        counts[col] = _zscore_column(values, col, mean_window, std_window, z_score, side, buf[col].copy(),
+                                     state[col].copy(), count[0], empty, empty, 0)
+    offsets = np.zeros(num_assets + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    positions = np.empty(offsets[-1], dtype=np.int64)
+    sides     = np.empty(offsets[-1], dtype=np.int64)
+    for col in prange(num_assets):
+        _zscore_column(values, col, mean_window, std_window, z_score, side, buf[col], state[col], count[0],
+                       positions, sides, offsets[col])
+    count[0] += values.shape[0]
+    return offsets, positions, sides
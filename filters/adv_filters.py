@@ -1,12 +1,18 @@
 """
 Filters are used to filter the price in time series
 """
+import hashlib
+import os
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
 from PyEMD import EMD
 import pywt
 from statsmodels.robust import mad
 
+from util.multiprocess import lin_parts, process_jobs, process_jobs_
+
 def _filter_imfs(imfs, threshold):
     """
     This moethod is required by all the bar types and is used to create the desired bars
@@ -34,6 +40,172 @@ def emd_filter(raw_time_series, threshold=0.5):
     return new_time_series
 
 
+def _emd_rows(rows, molecule=0):
+    """
+    IMFs of each row of a 2-D array, one fresh EMD per row as in emd_filter. Returns them with the
+    molecule number.
+    """
+    return molecule, [EMD().emd(row) for row in rows]
+
+
+class EMDCache:
+    """
+    On-disk memo of IMFs, one .npy file per series keyed by a hash of its content. The files are evicted
+    in least recently used order when the cache grows over max_size_mb. The order and the total size are
+    kept in memory, read from the directory once, so that a put does not scan the directory.
+    """
+
+    def __init__(self, cache_dir, max_size_mb=1024):
+        """
+        Constructor
+
+        :params
+        1. cache_dir: directory of the cache, created if needed
+        2. max_size_mb: size of the cache directory above which the least recently used IMFs are removed
+        """
+        self.cache_dir = cache_dir
+        self.max_size_mb = max_size_mb
+        os.makedirs(cache_dir, exist_ok=True)
+        self._entries = None  # OrderedDict file name -> size, least recently used first
+        self._size = 0
+
+    @staticmethod
+    def key(series):
+        """
+        Hash of the content of a series.
+        """
+        series = np.ascontiguousarray(series)
+        return hashlib.blake2b(series.dtype.str.encode() + series.tobytes(), digest_size=20).hexdigest()
+
+    def get(self, key):
+        """
+        The IMFs of a key, None if they are not cached. A hit refreshes the key for the LRU eviction.
+        """
+        path = os.path.join(self.cache_dir, key + '.npy')
+        try:
+            imfs = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        entries = self._index()
+        if key + '.npy' in entries:
+            entries.move_to_end(key + '.npy')
+        else:
+            # written by another cache on the same directory
+            self._add(key + '.npy', os.path.getsize(path))
+        return imfs
+
+    def put(self, key, imfs):
+        """
+        Store the IMFs of a key, then evict the least recently used keys if the cache is over max_size_mb.
+        """
+        path = os.path.join(self.cache_dir, key + '.npy')
+        tmp  = '{}.{}.tmp.npy'.format(path[:-4], os.getpid())
+        np.save(tmp, imfs)
+        os.replace(tmp, path)
+        self._add(key + '.npy', os.path.getsize(path))
+        if self._size > self.max_size_mb * 2**20:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used IMFs until the cache is within max_size_mb.
+        """
+        entries = self._index()
+        while entries and self._size > self.max_size_mb * 2**20:
+            name, file_size = entries.popitem(last=False)
+            self._size -= file_size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def _add(self, name, file_size):
+        entries = self._index()
+        self._size += file_size - entries.pop(name, 0)
+        entries[name] = file_size
+
+    def _index(self):
+        """
+        The LRU order of the cache, read from the modification times of the files on first use.
+        """
+        if self._entries is None:
+            found = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.npy') and '.tmp' not in name:
+                    try:
+                        stat = os.stat(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime, name, stat.st_size))
+            self._entries = OrderedDict((name, file_size) for _, name, file_size in sorted(found))
+            self._size = sum(self._entries.values())
+        return self._entries
+
+
+def emd_batch(series, num_threads=1, mp_batches=1, cache=None):
+    """
+    IMFs of many series at once, the decompositions run in a process pool and can be memoized on disk.
+    :params
+    1. series: 2-D numpy array, one series per row (e.g. the assets, or the rolling windows of
+    np.lib.stride_tricks.sliding_window_view)
+    2. num_threads: number of processes, 1 runs in this process
+    3. mp_batches: number of molecules per process
+    4. cache: EMDCache, or a directory for one, None for no cache
+
+    :return: list of the IMFs of each row, as emd.emd returns them
+    """
+    series = np.asarray(series)
+    if isinstance(cache, str):
+        cache = EMDCache(cache)
+    imfs = [None] * series.shape[0]
+    keys = [None] * series.shape[0]
+    # rows with the same content are decomposed once
+    first = {}
+    for i in range(series.shape[0]):
+        if cache is not None:
+            keys[i] = cache.key(series[i])
+            imfs[i] = cache.get(keys[i])
+        else:
+            keys[i] = EMDCache.key(series[i])
+        if imfs[i] is None and keys[i] not in first:
+            first[keys[i]] = i
+    todo = np.array(list(first.values()), dtype=np.int64)
+    if todo.shape[0] > 0:
+        parts = lin_parts(todo.shape[0], max(num_threads, 1) * mp_batches)
+        jobs  = [{'func': _emd_rows, 'rows': series[todo[parts[i - 1]:parts[i]]], 'molecule': i}
+                 for i in range(1, len(parts))]
+        out = process_jobs_(jobs) if num_threads == 1 else process_jobs(jobs, num_threads=num_threads)
+        # the pool returns the molecules in any order
+        out = [molecule_imfs for _, molecule_imfs in sorted(out, key=lambda x: x[0])]
+        computed = [row_imfs for molecule in out for row_imfs in molecule]
+        for i, row_imfs in zip(todo, computed):
+            imfs[i] = row_imfs
+            if cache is not None:
+                cache.put(keys[i], row_imfs)
+    for i in range(series.shape[0]):
+        if imfs[i] is None:
+            imfs[i] = imfs[first[keys[i]]]
+    return imfs
+
+
+def emd_filter_batch(series, threshold=0.5, num_threads=1, mp_batches=1, cache=None):
+    """
+    emd_filter of many series at once, see emd_batch. The cached IMFs do not depend on the threshold, so
+    the same cache serves every threshold.
+    :params
+    1. series: 2-D numpy array, one series per row
+    2. threshold: (float number) share of the high-frequency components that are dropped, in [0, 1]
+    3. num_threads: number of processes, 1 runs in this process
+    4. mp_batches: number of molecules per process
+    5. cache: EMDCache, or a directory for one, None for no cache
+
+    :return: 2-D numpy array of the filtered series
+    """
+    imfs = emd_batch(series, num_threads, mp_batches, cache)
+    return np.array([_filter_imfs(row_imfs, threshold) for row_imfs in imfs])
+
+
 def wvlet_filter(raw_time_series, wavelet='db4', level=1, title=None):
     """
     wavelet smooth function
@@ -55,18 +227,167 @@ def wvlet_filter(raw_time_series, wavelet='db4', level=1, title=None):
     return y
 
 
-def smooth_algo(arr_in, window, func, kwargs={}):
+def _smooth_windows(arr_in, window, smooth_func, kwargs, rows, offset=0):
     """
-    wavelet smooth function
+    Last value of smooth_func on the trailing windows of arr_in that start at the positions ``rows``.
+    Returns the positions shifted by ``offset`` and the values.
+    """
+    # writeable like the slices of arr_in that func used to receive
+    windows = np.lib.stride_tricks.sliding_window_view(arr_in, window, writeable=True)
+    return rows + offset, np.array([smooth_func(windows[row], **kwargs)[-1] for row in rows], dtype=np.float64)
+
+
+def _window_key(func, kwargs, window_arr):
+    """
+    Cache key of a window: the function, its arguments and a hash of the window content.
+    """
+    digest = hashlib.blake2b(np.ascontiguousarray(window_arr).tobytes(), digest_size=16).hexdigest()
+    return (getattr(func, '__module__', None), getattr(func, '__qualname__', repr(func)),
+            repr(sorted(kwargs.items())), window_arr.dtype.str, digest)
+
+
+def smooth_algo(arr_in, window, func, kwargs={}, every=1, num_threads=1, mp_batches=1, cache=None):
+    """
+    causal smooth function: the value at i is the last value of func on the window ending at i, so that no
+    future data is used. The windows are strided views of arr_in, they can be spread over processes, and
+    their results can be cached by window content.
     :params
-    1. raw_time_series: (time series in numpy array)
-    2. wavelet:       type of wavelet (string)
-    3. level: cut-off level
+    1. arr_in: (time series in numpy array)
+    2. window: length of the trailing window
+    3. func: filter applied to each window, e.g. emd_filter or wvlet_filter
+    4. kwargs: keyword arguments of func
+    5. every: recompute every k steps, in between the value of the last computed window is carried
+    6. num_threads: number of processes, 1 runs in this process
+    7. mp_batches: number of molecules per process
+    8. cache: dict-like shared between calls, mapping the window keys to the smoothed values
 
-    :return: the same-length data
+    :return: the same-length data, the first window - 1 values are the raw ones
     """
     arr_length = arr_in.shape[0]
     filter_singal = np.copy(arr_in)
-    for i in range(window-1, arr_length):
-        filter_singal[i] = func(arr_in[i-window+1: i+1], **kwargs)[-1]
-    return filter_singal
\ No newline at end of file
+    if arr_length < window:
+        return filter_singal
+    windows = np.lib.stride_tricks.sliding_window_view(arr_in, window)
+    rows    = np.arange(0, windows.shape[0], every)
+    if cache is None:
+        todo = np.arange(rows.shape[0])
+    else:
+        # windows already cached, or with the same content as an earlier one, are not computed
+        keys, first = [_window_key(func, kwargs, windows[row]) for row in rows], {}
+        for slot, key in enumerate(keys):
+            if key not in cache and key not in first:
+                first[key] = slot
+        todo = np.array(list(first.values()), dtype=np.int64)
+    todo_values = np.empty(todo.shape[0])
+    if todo.shape[0] > 0:
+        parts = lin_parts(todo.shape[0], max(num_threads, 1) * mp_batches)
+        jobs  = []
+        for i in range(1, len(parts)):
+            molecule = rows[todo[parts[i - 1]:parts[i]]]
+            # each job only carries the values of its own windows
+            jobs.append({'func': _smooth_windows, 'arr_in': arr_in[molecule[0]:molecule[-1] + window],
+                         'window': window, 'smooth_func': func, 'kwargs': kwargs, 'rows': molecule - molecule[0],
+                         'offset': molecule[0]})
+        out = process_jobs_(jobs) if num_threads == 1 else process_jobs(jobs, num_threads=num_threads)
+        computed = dict(kv for job_rows, job_values in out for kv in zip(job_rows, job_values))
+        todo_values = np.array([computed[row] for row in rows[todo]])
+    if cache is None:
+        values = todo_values
+    else:
+        cache.update(zip((keys[slot] for slot in todo), todo_values))
+        values = np.array([cache[key] for key in keys])
+    # the value of the last computed window until the next one
+    last = np.searchsorted(rows, np.arange(windows.shape[0]), side='right') - 1
+    filter_singal[window - 1:] = values[last]
+    return filter_singal
+
+
+def _wvlet_last(windows, wavelet, level, sigma=None):
+    """
+    Last value of wvlet_filter on each row of a 2-D array of windows, decomposed together along the rows.
+    The noise level sigma of each row is estimated by mad unless it is given.
+    """
+    coeff = pywt.wavedec(windows, wavelet, mode="per", axis=1)
+    if sigma is None:
+        sigma = mad(coeff[-level], axis=1)
+    uthresh = sigma * np.sqrt(2*np.log(windows.shape[1]))
+    coeff[1:] = (pywt.threshold(i, value=uthresh[:, None], mode='soft') for i in coeff[1:])
+    y = pywt.waverec(coeff, wavelet, mode="per", axis=1)
+    return y[:, -1], sigma
+
+
+class WaveletDenoiser:
+    """
+    Causal wavelet denoiser: the value at each bar is the last value of wvlet_filter on the trailing window
+    ending at that bar, which is smooth_algo(arr_in, window, wvlet_filter) without its cost. The batch
+    transform decomposes many windows at once, and update keeps a fixed-length buffer so that each new bar
+    costs one decomposition of a window. The mad estimate of the noise can be reused for mad_every bars.
+    """
+
+    def __init__(self, window, wavelet='db4', level=1, mad_every=1, chunk_size=4096):
+        """
+        Constructor
+
+        :params
+        1. window: length of the trailing window
+        2. wavelet: type of wavelet (string)
+        3. level: cut-off level
+        4. mad_every: the noise level is estimated on every mad_every-th window and reused in between,
+        1 gives the values of smooth_algo(wvlet_filter)
+        5. chunk_size: number of windows decomposed together by transform
+        """
+        self.window = window
+        self.wavelet = wavelet
+        self.level = level
+        self.mad_every = mad_every
+        self.chunk_size = chunk_size
+        # each value is written twice so that the last window is always a contiguous slice
+        self._buffer = np.empty(2 * window)
+        self._count = 0
+        self._sigma = None
+
+    def transform(self, arr_in):
+        """
+        Denoise a whole series, independently of the streaming state.
+        :params
+        1. arr_in: (time series in numpy array)
+
+        :return: the same-length data, the first window - 1 values are the raw ones
+        """
+        arr_in = np.asarray(arr_in, dtype=np.float64)
+        filter_singal = np.copy(arr_in)
+        if arr_in.shape[0] < self.window:
+            return filter_singal
+        windows = np.lib.stride_tricks.sliding_window_view(arr_in, self.window)
+        # chunks start on a multiple of mad_every so that the noise level is estimated on the same windows
+        step = max(self.chunk_size // self.mad_every, 1) * self.mad_every
+        for start in range(0, windows.shape[0], step):
+            chunk = windows[start:start + step]
+            sigma = None
+            if self.mad_every > 1:
+                coeff = pywt.wavedec(chunk[::self.mad_every], self.wavelet, mode="per", axis=1)
+                sigma = np.repeat(mad(coeff[-self.level], axis=1), self.mad_every)[:chunk.shape[0]]
+            filter_singal[self.window - 1 + start:self.window - 1 + start + chunk.shape[0]] = \
+                _wvlet_last(chunk, self.wavelet, self.level, sigma)[0]
+        return filter_singal
+
+    def update(self, value):
+        """
+        Denoised value of the next bar.
+        :params
+        1. value: the new raw value
+
+        :return: the denoised value, the raw value until the buffer holds a full window
+        """
+        pos = self._count % self.window
+        self._buffer[pos] = self._buffer[pos + self.window] = value
+        self._count += 1
+        if self._count < self.window:
+            return value
+        start = self._count % self.window
+        last_window = self._buffer[None, start:start + self.window]
+        row = self._count - self.window
+        if row % self.mad_every == 0:
+            self._sigma = None
+        out, self._sigma = _wvlet_last(last_window, self.wavelet, self.level, self._sigma)
+        return out[0]
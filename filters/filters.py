@@ -5,6 +5,19 @@ Events are used to measure the return from the events.
 import numpy as np
 import pandas as pd
 
+from ._filter_kernels import cusum_positions, cusum_positions_2d, zscore_positions_2d
+
+def _threshold_array(threshold, index):
+    """
+    The threshold of every row of ``index``, nan where a pd.Series threshold has no value.
+    """
+    if isinstance(threshold, (float, int)):
+        return np.full(len(index), float(threshold))
+    elif isinstance(threshold, pd.Series):
+        return threshold.reindex(index).to_numpy(dtype=np.float64)
+    raise ValueError('threshold is neither float nor pd.Series!')
+
+
 def cusum_filter(raw_time_series, threshold, time_stamps=True):
     """
     This method is required by all the bar types and is used to create the desired bars.
@@ -15,45 +28,98 @@ def cusum_filter(raw_time_series, threshold, time_stamps=True):
     3. time_stamps:   DateTimeIndex if true a list than false
 
     :return: (datetime index vector) vector of datetimes when the events occurred. This is used later to sample.
+
+    See cusum_filter_2d to filter many assets at once.
     """
-    t_events = []
-    s_pos = 0
-    s_neg = 0
-
-    # log returns
-    raw_time_series = pd.DataFrame(raw_time_series)  # Convert to DataFrame
-    raw_time_series.columns = ['price']
-    raw_time_series['log_ret'] = raw_time_series.price.apply(np.log).diff()
-    if isinstance(threshold, (float, int)):
-        raw_time_series['threshold'] = threshold
-    elif isinstance(threshold, pd.Series):
-        raw_time_series.loc[threshold.index, 'threshold'] = threshold
-    else:
-        raise ValueError('threshold is neither float nor pd.Series!')
-
-    raw_time_series = raw_time_series.iloc[1:]  # Drop first na values
-    # Get event time stamps for the entire series
-    # each tup will be row data in pandas series
-    for tup in raw_time_series.itertuples():
-        thresh = tup.threshold
-        pos   = float(s_pos + tup.log_ret)
-        neg   = float(s_neg + tup.log_ret)
-        s_pos = max(0.0, pos)
-        s_neg = min(0.0, neg)
-        if s_neg < -thresh:
-            s_neg = 0
-            t_events.append(tup.Index)
-        elif s_pos > thresh:
-            s_pos = 0
-            t_events.append(tup.Index)
+    raw_time_series = pd.DataFrame(raw_time_series).iloc[:, 0]
+    thresh  = _threshold_array(threshold, raw_time_series.index)
+    log_ret = np.diff(np.log(raw_time_series.to_numpy(dtype=np.float64)))
+    # the first price has no log return
+    idx = cusum_positions(log_ret, thresh[1:], np.zeros(2)) + 1
+    t_events = raw_time_series.index[idx]
     # Return DatetimeIndex or list
     if time_stamps:
         event_timestamps = pd.DatetimeIndex(t_events)
         return event_timestamps
-    return t_events
+    return list(t_events)
+
+
+def cusum_filter_2d(prices, threshold):
+    """
+    cusum_filter of many assets at once, the assets run in parallel.
+    :param
+    1. prices:    (DataFrame or np.ndarray) time x assets close prices, aligned on a common time index
+    2. threshold: (float, array or DataFrame) a float for all the assets, an array of one threshold per asset,
+    a time x assets array, or a DataFrame aligned on the prices, nan for no event
+
+    :return: (tuple) offsets, int64 array of assets + 1 entries, and positions, int64 array of the row positions
+    of the events. The events of asset j are positions[offsets[j]:offsets[j + 1]], the same rows as
+    cusum_filter on the column j.
+    """
+    if isinstance(prices, pd.DataFrame):
+        if isinstance(threshold, pd.DataFrame):
+            threshold = threshold.reindex(index=prices.index, columns=prices.columns)
+        prices = prices.to_numpy(dtype=np.float64)
+    # the columns are scanned one by one
+    prices = np.asfortranarray(prices, dtype=np.float64)
+    threshold = np.asarray(threshold, dtype=np.float64)
+    if threshold.ndim < 2:
+        threshold = np.broadcast_to(threshold, prices.shape)
+    if threshold.shape != prices.shape:
+        raise ValueError('threshold of shape {} does not match the prices {}'.format(threshold.shape, prices.shape))
+    return cusum_positions_2d(prices, threshold)
+
+
+class CusumFilter:
+    """
+    Streaming version of cusum_filter: the prices are fed batch by batch, in time order, and s_pos, s_neg
+    and the last price are carried over between calls, so that the events of all the batches are the
+    events of cusum_filter on the whole series.
+    """
+
+    def __init__(self, threshold):
+        """
+        Constructor
 
+        :param threshold: (float or pd.Series) threshold of the events, a pd.Series must cover the index of
+                          the batches
+        """
+        self.threshold = threshold
+        self.s_pos = 0.0
+        self.s_neg = 0.0
+        self.last_log_price = np.nan
+        self._has_last = False
 
-def z_score_filter(pd_series, mean_window, std_window, z_score=3, time_stamps=True):
+    def update(self, prices, time_stamps=True):
+        """
+        Events of the next batch of prices.
+
+        :param prices: (series) of close prices, following the previous batch
+        :param time_stamps: DateTimeIndex if true a list than false
+        :return: the times of the events of the batch
+        """
+        prices  = pd.DataFrame(prices).iloc[:, 0]
+        thresh  = _threshold_array(self.threshold, prices.index)
+        log_price = np.log(prices.to_numpy(dtype=np.float64))
+        log_ret = np.diff(log_price, prepend=self.last_log_price)
+        state   = np.array([self.s_pos, self.s_neg])
+        # the first price of the stream has no log return
+        first   = 0 if self._has_last else 1
+        idx     = cusum_positions(log_ret[first:], thresh[first:], state) + first
+        self.s_pos, self.s_neg = state
+        if log_price.shape[0] > 0:
+            self.last_log_price, self._has_last = log_price[-1], True
+        t_events = prices.index[idx]
+        if time_stamps:
+            return pd.DatetimeIndex(t_events)
+        return list(t_events)
+
+
+# tails of the z-score filter
+Z_SCORE_SIDES = {'up': 1, 'down': -1, 'both': 0}
+
+
+def z_score_filter(pd_series, mean_window, std_window, z_score=3, time_stamps=True, side='up'):
     """
     Z-score filter
     :param
@@ -62,12 +128,79 @@ def z_score_filter(pd_series, mean_window, std_window, z_score=3, time_stamps=Tr
     3. std_window:   rolling std window, int
     4. z_score:      number of standard deviations to trigger the event, float
     5. time_stamps:  DateTimeIndex if true a list than false
+    6. side:         'up' for the values above mean + z_score * std, 'down' for the values below mean - z_score * std,
+    'both' for either
 
     :return: (datetime index vector) vector of datetimes when the events occurred. This is used later to sample.
     """
-    t_events = pd_series[pd_series >= pd_series.rolling(window=mean_window).mean() +
-                               z_score * pd_series.rolling(window=std_window).std()].index
+    offsets, positions, _ = ZScoreFilter(mean_window, std_window, z_score, side).update(
+        pd_series.to_numpy(dtype=np.float64)[:, None])
+    t_events = pd_series.index[positions]
     if time_stamps:
         event_timestamps = pd.DatetimeIndex(t_events)
         return event_timestamps
     return t_events
+
+
+def z_score_filter_2d(values, mean_window, std_window, z_score=3, side='up'):
+    """
+    z_score_filter of many assets at once, in a single pass over a time x assets matrix.
+    :param
+    1. values: (DataFrame or np.ndarray) time x assets values, aligned on a common time index
+    2. mean_window:  rolling mean window, int
+    3. std_window:   rolling std window, int
+    4. z_score:      number of standard deviations to trigger the event, float
+    5. side:         'up', 'down' or 'both', see z_score_filter
+
+    :return: (tuple) offsets, positions and sides int64 arrays, the events of asset j are the rows
+    positions[offsets[j]:offsets[j + 1]], on the upper tail where sides is 1 and the lower tail where it is -1
+    """
+    return ZScoreFilter(mean_window, std_window, z_score, side).update(values)
+
+
+class ZScoreFilter:
+    """
+    Streaming version of z_score_filter_2d: the rows are fed batch by batch, in time order, and the rolling
+    windows of every asset are carried over between calls.
+    """
+
+    def __init__(self, mean_window, std_window, z_score=3, side='up'):
+        """
+        Constructor
+
+        :param mean_window: rolling mean window, int
+        :param std_window: rolling std window, int
+        :param z_score: number of standard deviations to trigger the event, float
+        :param side: 'up', 'down' or 'both', see z_score_filter
+        """
+        if side not in Z_SCORE_SIDES:
+            raise ValueError('side should be one of {}'.format(list(Z_SCORE_SIDES)))
+        self.mean_window = mean_window
+        self.std_window = std_window
+        self.z_score = z_score
+        self.side = side
+        self._buffer = None
+        self._state = None
+        self._count = np.zeros(1, dtype=np.int64)
+
+    def update(self, values):
+        """
+        Events of the next rows.
+
+        :param values: (series, DataFrame or np.ndarray) the next values of one asset, or time x assets values
+        :return: the times of the events of the batch for a series, else the offsets, positions and sides of
+        z_score_filter_2d, the positions counted from the first row of the batch
+        """
+        if isinstance(values, pd.Series):
+            _, positions, _ = self.update(values.to_numpy(dtype=np.float64)[:, None])
+            return pd.DatetimeIndex(values.index[positions])
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        if self._buffer is None:
+            self._buffer = np.empty((values.shape[1], max(self.mean_window, self.std_window)))
+            self._state = np.zeros((values.shape[1], 7))
+        if values.shape[1] != self._buffer.shape[0]:
+            raise ValueError('expected {} assets, got {}'.format(self._buffer.shape[0], values.shape[1]))
+        return zscore_positions_2d(values, self.mean_window, self.std_window, float(self.z_score),
+                                   Z_SCORE_SIDES[self.side], self._buffer, self._state, self._count)
@@ -3,4 +3,4 @@ Functions derived from Chapter 3: Labeling
 """
 
 from .labeling import add_vertical_barrier, apply_pt_sl_on_ent, barrier_touched, drop_labels, \
-    get_bins, get_events
+    get_bins, get_events, sweep_labels, TripleBarrierLabeler
@@ -0,0 +1,106 @@
+"""
+Compiled kernels of the triple-barrier method. They work on the positions of the events in a float64
+price array, and return the positions of the first barrier touches, -1 when a barrier is not touched.
+"""
+
+import numpy as np
+from numba import jit, prange
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def barrier_touches(price, start, end, profit_taking, stop_loss, side):
+    """
+    First touches of the horizontal barriers of each event. The path of an event runs from its start
+    position to the position before its end, and its return at j is (price[j] / price[start] - 1) * side,
+    as in apply_pt_sl_on_ent.
+
+    :args
+    1. price: (np.ndarray), (float64) the prices
+    2. start: (np.ndarray), (int64) the position of the start of each event
+    3. end: (np.ndarray), (int64) the position after the vertical barrier of each event
+    4. profit_taking: (np.ndarray), (float64) the profit taking return of each event, touched when the
+       return is above it, nan if there is no profit taking barrier
+    5. stop_loss: (np.ndarray), (float64) the stop loss return of each event, touched when the return is
+       below it, nan if there is no stop loss barrier
+    6. side: (np.ndarray), (float64) the side of each event
+
+    :return
+    (tuple) np.ndarray (int64) of the positions of the first profit taking touches and np.ndarray (int64)
+    of the positions of the first stop loss touches, -1 if not touched
+    """
+    num_events = start.shape[0]
+    pt_pos = np.full(num_events, -1, dtype=np.int64)
+    sl_pos = np.full(num_events, -1, dtype=np.int64)
+    for k in range(num_events):
+        _first_touch(price, start[k], end[k], profit_taking[k], stop_loss[k], side[k], pt_pos, sl_pos, k)
+    return pt_pos, sl_pos
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _first_touch(price, start, end, profit_taking, stop_loss, side, pt_pos, sl_pos, k):
+    """
+    Path scan of one event, see barrier_touches. The scan stops once both barriers are touched.
+    """
+    base = price[start]
+    pt_done = np.isnan(profit_taking)
+    sl_done = np.isnan(stop_loss)
+    for j in range(start, end):
+        if pt_done and sl_done:
+            break
+        ret = (price[j] / base - 1) * side
+        if not sl_done and ret < stop_loss:
+            sl_pos[k] = j
+            sl_done = True
+        if not pt_done and ret > profit_taking:
+            pt_pos[k] = j
+            pt_done = True
+
+
+@jit(nopython=True, nogil=True, cache=True, parallel=True)
+def barrier_sweep(price, start, end, target, side, profit_taking, stop_loss):
+    """
+    First touches of a grid of horizontal barriers of each event, in a single scan of its path. The scan
+    keeps the running max and min of the return (price[j] / price[start] - 1) * side, a profit taking
+    barrier is first touched where the running max rises above it and a stop loss barrier where the running
+    min falls below it. The multiples are sorted, so that the barriers of an event are touched in the grid
+    order, and the scan stops once they are all touched. The events run in parallel.
+
+    :args
+    1. price: (np.ndarray), (float64) the prices
+    2. start: (np.ndarray), (int64) the position of the start of each event
+    3. end: (np.ndarray), (int64) the position after the longest vertical barrier of each event
+    4. target: (np.ndarray), (float64) the non-negative unit width of the barriers of each event
+    5. side: (np.ndarray), (float64) the side of each event
+    6. profit_taking: (np.ndarray), (float64) increasing positive multiples of the target, a barrier is
+       touched when the return is above multiple * target
+    7. stop_loss: (np.ndarray), (float64) increasing positive multiples of the target, a barrier is touched
+       when the return is below -multiple * target
+
+    :return
+    (tuple) np.ndarray (int64) events x profit taking multiples of the positions of the first profit taking
+    touches and np.ndarray (int64) events x stop loss multiples of the first stop loss touches, -1 if not
+    touched
+    """
+    num_events = start.shape[0]
+    num_pt, num_sl = profit_taking.shape[0], stop_loss.shape[0]
+    pt_pos = np.full((num_events, num_pt), -1, dtype=np.int64)
+    sl_pos = np.full((num_events, num_sl), -1, dtype=np.int64)
+    for k in prange(num_events):
+        base = price[start[k]]
+        run_max, run_min = -np.inf, np.inf
+        next_pt, next_sl = 0, 0
+        for j in range(start[k], end[k]):
+            if next_pt == num_pt and next_sl == num_sl:
+                break
+            ret = (price[j] / base - 1) * side[k]
+            if ret > run_max:
+                run_max = ret
+                while next_pt < num_pt and run_max > profit_taking[next_pt] * target[k]:
+                    pt_pos[k, next_pt] = j
+                    next_pt += 1
+            if ret < run_min:
+                run_min = ret
+                while next_sl < num_sl and run_min < -stop_loss[next_sl] * target[k]:
+                    sl_pos[k, next_sl] = j
+                    next_sl += 1
+    return pt_pos, sl_pos
@@ -3,9 +3,15 @@ The implementation for the Triple Barrier Method and Meta-Labeling.
 The codes are modified from AFML code sinppets.
 """
 
+import heapq
+
 import numpy as np
 import pandas as pd
-from util.multiprocess import mp_pandas_obj
+from multiprocessing import shared_memory
+
+from util.multiprocess import process_jobs, process_jobs_
+
+from ._barrier_kernels import barrier_sweep, barrier_touches
 
 def apply_pt_sl_on_ent(df_price, events, pt_sl, molecule):
     """
@@ -35,32 +41,122 @@ def apply_pt_sl_on_ent(df_price, events, pt_sl, molecule):
                 3 pt:  the time that touch the up line (nan means no touch)
     """
     events_ = events.loc[molecule]
-    out     = events_[['ent']].copy(deep=True)
-
-    profit_taking_multiple = pt_sl[0]
-    stop_loss_multiple     = pt_sl[1]
+    arrays  = _barrier_arrays(df_price, events_, pt_sl)
+    pt_pos, sl_pos = barrier_touches(*arrays)
+    return _touch_frame(df_price, events_, pt_pos, sl_pos)
 
-    # Profit taking active
-    if profit_taking_multiple > 0:
-        profit_taking = profit_taking_multiple * events_['trgt']
-    else:
-        profit_taking = pd.Series(index=events.index)  # NaNs
 
-    # Stop loss active
-    if stop_loss_multiple > 0:
-        stop_loss = -stop_loss_multiple * events_['trgt']
-    else:
-        stop_loss = pd.Series(index=events.index)  # NaNs
-
-    # Get events
-    for loc, vertical_barrier in events_['ent'].fillna(df_price.index[-1]).iteritems():
-        closing_prices = df_price[loc: vertical_barrier]  # Path prices for a given trade
-        cum_returns = (closing_prices / df_price[loc] - 1) * events_.at[loc, 'side']  # Path returns
-        out.loc[loc, 'sl'] = cum_returns[cum_returns < stop_loss[loc]].index.min()  # Earliest stop loss date
-        out.loc[loc, 'pt'] = cum_returns[cum_returns > profit_taking[loc]].index.min()  # Earliest profit taking date
+def _barrier_arrays(df_price, events, pt_sl):
+    """
+    The arrays of barrier_touches: the prices, the path of each event as positions in the prices, the
+    vertical barrier included, the profit taking and stop loss returns and the sides.
+    """
+    trgt = events['trgt'].to_numpy(dtype=np.float64)
+    nans = np.full(events.shape[0], np.nan)
+    # Profit taking active, else NaNs
+    profit_taking = pt_sl[0] * trgt if pt_sl[0] > 0 else nans
+    # Stop loss active, else NaNs
+    stop_loss = -pt_sl[1] * trgt if pt_sl[1] > 0 else nans
+    start, end = _event_positions(df_price.index, events)
+    return (df_price.to_numpy(dtype=np.float64), start, end, profit_taking, stop_loss,
+            events['side'].to_numpy(dtype=np.float64))
+
+
+def _touch_frame(df_price, events, pt_pos, sl_pos):
+    """
+    The output of apply_pt_sl_on_ent from the touch positions.
+    """
+    out = events[['ent']].copy(deep=True)
+    out['sl'] = _touch_times(df_price.index, sl_pos)  # Earliest stop loss date
+    out['pt'] = _touch_times(df_price.index, pt_pos)  # Earliest profit taking date
     return out
 
 
+def _path_parts(start, end, num_molecules):
+    """
+    Split the events into molecules of about the same total path length, sum of end - start, rather than
+    the same number of events. Returns the num_molecules + 1 bounds of the molecules, empty ones removed.
+    """
+    cum_length = np.cumsum(np.maximum(end - start, 0) + 1)
+    targets = np.linspace(0, cum_length[-1], num_molecules + 1)[1:-1]
+    # a molecule ends with the event whose path crosses its share of the total length
+    parts = np.minimum(np.searchsorted(cum_length, targets, side='left') + 1, start.shape[0])
+    return np.unique(np.concatenate([[0], parts, [start.shape[0]]]))
+
+
+def _shm_touches(shm_name, num_prices, num_events, lo, hi):
+    """
+    Barrier touches of the events lo to hi, reading the prices and the events from the shared memory block
+    written by _parallel_barrier_touches.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        price, start, end, profit_taking, stop_loss, side = _shm_views(shm.buf, num_prices, num_events)
+        pt_pos, sl_pos = barrier_touches(price, start[lo:hi], end[lo:hi], profit_taking[lo:hi], stop_loss[lo:hi],
+                                         side[lo:hi])
+        del price, start, end, profit_taking, stop_loss, side
+    finally:
+        shm.close()
+    return lo, pt_pos, sl_pos
+
+
+def _shm_views(buf, num_prices, num_events):
+    """
+    The prices and the five event arrays laid out one after the other in a shared memory buffer.
+    """
+    views, offset = [], 0
+    for length, dtype in [(num_prices, np.float64), (num_events, np.int64), (num_events, np.int64),
+                          (num_events, np.float64), (num_events, np.float64), (num_events, np.float64)]:
+        views.append(np.ndarray(length, dtype=dtype, buffer=buf, offset=offset))
+        offset += length * 8
+    return views
+
+
+def _parallel_barrier_touches(price, start, end, profit_taking, stop_loss, side, num_threads=24, mp_batches=1):
+    """
+    barrier_touches in a process pool. The prices and the events are written once to a shared memory block
+    and every job only receives the bounds of its molecule, the molecules being balanced by path length.
+    """
+    num_prices, num_events = price.shape[0], start.shape[0]
+    shm = shared_memory.SharedMemory(create=True, size=max(8 * (num_prices + 5 * num_events), 1))
+    try:
+        views = _shm_views(shm.buf, num_prices, num_events)
+        for view, arr in zip(views, (price, start, end, profit_taking, stop_loss, side)):
+            view[:] = arr
+        # the views must be released before the block is closed
+        del views, view
+        parts = _path_parts(start, end, num_threads * mp_batches)
+        jobs  = [{'func': _shm_touches, 'shm_name': shm.name, 'num_prices': num_prices, 'num_events': num_events,
+                  'lo': parts[i - 1], 'hi': parts[i]} for i in range(1, len(parts))]
+        out = process_jobs_(jobs) if num_threads == 1 else process_jobs(jobs, task='barrier_touches',
+                                                                        num_threads=num_threads)
+    finally:
+        shm.close()
+        shm.unlink()
+    pt_pos = np.full(num_events, -1, dtype=np.int64)
+    sl_pos = np.full(num_events, -1, dtype=np.int64)
+    for lo, pt_part, sl_part in out:
+        pt_pos[lo:lo + pt_part.shape[0]] = pt_part
+        sl_pos[lo:lo + sl_part.shape[0]] = sl_part
+    return pt_pos, sl_pos
+
+
+def _event_positions(price_index, events):
+    """
+    Positions of the start of each event and after its vertical barrier in the sorted price index, the last
+    price when there is no vertical barrier, like the label slice df_price[loc: vertical_barrier].
+    """
+    start = price_index.searchsorted(events.index, side='left').astype(np.int64)
+    end   = price_index.searchsorted(events['ent'].fillna(price_index[-1]), side='right').astype(np.int64)
+    return start, end
+
+
+def _touch_times(price_index, positions):
+    """
+    Times of the touch positions, NaT for -1.
+    """
+    return price_index[np.maximum(positions, 0)].where(positions >= 0)
+
 
 def add_vertical_barrier(df_price, t_events=None, num_days=0, num_hours=0, num_minutes=0, num_seconds=0):
     """
@@ -104,6 +200,37 @@ def add_vertical_barrier(df_price, t_events=None, num_days=0, num_hours=0, num_m
 
 
 
+def _events_frame(df_price, target, t_events, min_ret, vertical_barrier_times, side_prediction, nan_rt_keep):
+    """
+    The events of get_events before the barrier touches: datetime index of the start times and the columns
+    ent (vertical barrier), trgt and side.
+    """
+    if t_events is None:
+        t_events = df_price.index
+    # 1) Get target
+    target = target.reindex(t_events)
+    target.dropna() #in case the t_events doest not match target
+    target = target[target > min_ret]  # min_ret
+
+    # 2) Get vertical barrier (max holding period)
+    if vertical_barrier_times is False:
+        vertical_barrier_times = pd.Series(pd.NaT, index=t_events)
+
+    # 3) Form events object, apply stop loss on vertical barrier
+    if side_prediction is None:
+        side_ = pd.Series(1.0, index=target.index)
+    else:
+        side_ = side_prediction.reindex(target.index) # Subset side_prediction on target index.
+
+    # Create a new df with [v_barrier, target, side] and drop rows that are NA in target
+    events = pd.concat({'ent': vertical_barrier_times, 'trgt': target, 'side': side_}, axis=1)
+    events = events.dropna(subset=['side'])
+    if nan_rt_keep:
+        events = events.fillna(value={'trgt': min_ret})
+    events = events.dropna(subset=['trgt'])
+    return events
+
+
 def get_events(df_price,
                target,
                t_events=None,
@@ -150,39 +277,20 @@ def get_events(df_price,
             -events['pt'] Profit taking multiple
             -events['sl'] Stop loss multiple
     """
-    if t_events is None:
-        t_events = df_price.index
-    # 1) Get target
-    target = target.reindex(t_events)
-    target.dropna() #in case the t_events doest not match target
-    target = target[target > min_ret]  # min_ret
-
-    # 2) Get vertical barrier (max holding period)
-    if vertical_barrier_times is False:
-        vertical_barrier_times = pd.Series(pd.NaT, index=t_events)
-
-    # 3) Form events object, apply stop loss on vertical barrier
+    events = _events_frame(df_price, target, t_events, min_ret, vertical_barrier_times, side_prediction,
+                           nan_rt_keep)
     if side_prediction is None:
-        side_ = pd.Series(1.0, index=target.index)
         pt_sl_ = [pt_sl[0], pt_sl[0]]
     else:
-        side_ = side_prediction.reindex(target.index) # Subset side_prediction on target index.
         pt_sl_ = pt_sl[:2]
 
-    # Create a new df with [v_barrier, target, side] and drop rows that are NA in target
-    events = pd.concat({'ent': vertical_barrier_times, 'trgt': target, 'side': side_}, axis=1)
-    events = events.dropna(subset=['side'])
-    if nan_rt_keep:
-        events = events.fillna(value={'trgt': min_ret})
-    events = events.dropna(subset=['trgt'])
-
-    # Apply Triple Barrier It may be very slow
-    first_touch_dates = mp_pandas_obj(func=apply_pt_sl_on_ent,
-                                      pd_obj=('molecule', events.index),
-                                      num_threads=num_threads,
-                                      df_price=df_price,
-                                      events=events,
-                                      pt_sl=pt_sl_)
+    # Apply Triple Barrier, the workers share the prices and the events instead of pickling them
+    arrays = _barrier_arrays(df_price, events, pt_sl_)
+    if num_threads == 1 or events.shape[0] == 0:
+        pt_pos, sl_pos = barrier_touches(*arrays)
+    else:
+        pt_pos, sl_pos = _parallel_barrier_touches(*arrays, num_threads=num_threads)
+    first_touch_dates = _touch_frame(df_price, events, pt_pos, sl_pos)
 
     events['ent'] = first_touch_dates.dropna(how='all').min(axis=1)  # pd.min ignores nan
 
@@ -195,6 +303,29 @@ def get_events(df_price,
 
     return events
 
+def _values_at(index, values, dates):
+    """
+    Values at the first index label at or after each date, nan past the end, as a bfill reindex.
+    """
+    pos = index.searchsorted(dates, side='left')
+    out = np.full(pos.shape[0], np.nan)
+    inside = pos < values.shape[0]
+    out[inside] = values[pos[inside]]
+    return out
+
+
+def _touch_labels(ret, target, pt, sl):
+    """
+    Labels of barrier_touched from the arrays of the log returns, targets and profit taking and stop loss
+    multiples of the events.
+    """
+    pt_level_reached = ret > target * pt
+    sl_level_reached = ret < -target * sl
+
+    # Top barrier reached: 1, bottom barrier reached: -1, else vertical barrier reached: 0
+    return np.where((ret > 0.0) & pt_level_reached, 1, np.where((ret < 0.0) & sl_level_reached, -1, 0))
+
+
 def barrier_touched(out_df, events):
     """
     From AFML,
@@ -218,23 +349,9 @@ def barrier_touched(out_df, events):
             - ret
             - target
     """
-    store = []
-    for date_time, values in out_df.iterrows():
-        ret = values['ret']
-        target = values['trgt']
-
-        pt_level_reached = ret > target * events.loc[date_time, 'pt']
-        sl_level_reached = ret < -target * events.loc[date_time, 'sl']
-
-        if ret > 0.0 and pt_level_reached:
-            # Top barrier reached
-            store.append(1)
-        elif ret < 0.0 and sl_level_reached:
-            # Bottom barrier reached
-            store.append(-1)
-        else:
-            # Vertical barrier reached
-            store.append(0)
+    store = _touch_labels(out_df['ret'].to_numpy(dtype=np.float64), out_df['trgt'].to_numpy(dtype=np.float64),
+                          events['pt'].reindex(out_df.index).to_numpy(dtype=np.float64),
+                          events['sl'].reindex(out_df.index).to_numpy(dtype=np.float64))
 
     # Save to 'bin' column and return
     out_df['bin'] = store
@@ -272,17 +389,19 @@ def get_bins(triple_barrier_events, df_price):
              - ret: the achieved return
              - target: the targeted return
              - bin: two cases: one is [-1,0,1] and the ohter is [0,1]
+        the events without a touch time (NaT ent) are dropped. This also holds when no event has one,
+        where the loop version returned them as NaN rows with their side.
     """
 
-    # 1) Align prices with their respective events
+    # 1) Align prices with their respective events: the first price at or after each date, as a bfill reindex
     events_ = triple_barrier_events.dropna(subset=['ent'])
-    all_dates = events_.index.union(other=events_['ent'].values).drop_duplicates()
-    prices = df_price.reindex(all_dates, method='bfill')
+    log_price = np.log(df_price.to_numpy(dtype=np.float64))
 
     # 2) Create out DataFrame
     out_df = pd.DataFrame(index=events_.index)
     # Need to take the log returns, else your results will be skewed for short positions
-    out_df['ret'] = np.log(prices.loc[events_['ent'].values].values) - np.log(prices.loc[events_.index])
+    out_df['ret'] = (_values_at(df_price.index, log_price, events_['ent'].to_numpy())
+                     - _values_at(df_price.index, log_price, events_.index))
     out_df['trgt'] = events_['trgt']
 
     # Meta labeling: Events that were correct will have pos returns
@@ -302,9 +421,126 @@ def get_bins(triple_barrier_events, df_price):
     # Add the side to the output. This is useful for when a meta label model must be fit
     tb_cols = triple_barrier_events.columns
     if 'side' in tb_cols:
-        out_df['side'] = triple_barrier_events['side']
+        out_df['side'] = events_['side']
     return out_df
 
+def _grid_column(grid, level):
+    """
+    Column of a level in the sorted grid of positive levels, -1 for a disabled barrier.
+    """
+    return int(np.searchsorted(grid, level)) if level > 0 else -1
+
+
+def _holding_period(horizon):
+    """
+    Timedelta of a horizon of sweep_labels, a number is a number of seconds.
+    """
+    if isinstance(horizon, (int, float, np.integer, np.floating)):
+        return pd.Timedelta(seconds=horizon)
+    return pd.Timedelta(horizon)
+
+
+def sweep_labels(df_price,
+                 target,
+                 t_events=None,
+                 pt=[1],
+                 sl=[1],
+                 horizons=[None],
+                 min_ret=0.0,
+                 side_prediction=None,
+                 nan_rt_keep=True):
+    """
+    Labels of a grid of triple barriers, from a single scan of the path of each event.
+
+    The path of an event is scanned once up to its longest vertical barrier by barrier_sweep, which keeps
+    the running max and min of its return and records the first touch of every profit taking and stop loss
+    width of the grid. The first touches of a (pt, sl, horizon) triplet are the recorded ones before its
+    vertical barrier, so that every label set of the grid comes from this one scan. The label set of a
+    triplet is the same as
+
+        vertical_barrier_times = add_vertical_barrier(df_price, t_events, num_seconds=horizon)
+        get_bins(get_events(df_price, target, t_events, [pt, sl], min_ret, 1, vertical_barrier_times,
+                            side_prediction, nan_rt_keep), df_price)
+
+    :args:
+        1. df_price: pd.series of close prices with a sorted datetime index
+        2. target: pd.series, unit width of the horizontal barriers, see get_events
+        3. t_events: the timestamps that seed every triple barrier, default to the index of df_price
+        4. pt: list of the profit taking levels, 0 disables the barrier
+        5. sl: list of the stop loss levels, 0 disables the barrier. As in get_events, the stop loss of the
+           scan is the profit taking level when there is no side, and sl only changes the labels
+        6. horizons: list of the holding periods of the vertical barriers, numbers of seconds as num_seconds
+           of add_vertical_barrier, or strings and timedeltas accepted by pd.Timedelta, None for no vertical
+           barrier
+        7. min_ret: float, the minimum target return of an event
+        8. side_prediction: (series) side of the bets of a primary model, see get_events
+        9. nan_rt_keep: boolean value, see get_events
+
+    :return: dict of (pt, sl, horizon) to the output of get_bins
+    """
+    events = _events_frame(df_price, target, t_events, min_ret, False, side_prediction, nan_rt_keep)
+    index = df_price.index
+    num_prices = index.shape[0]
+    price = df_price.to_numpy(dtype=np.float64)
+    log_price = np.log(price)
+    trgt = events['trgt'].to_numpy(dtype=np.float64)
+    side = events['side'].to_numpy(dtype=np.float64)
+    start = index.searchsorted(events.index, side='left').astype(np.int64)
+
+    # vertical barriers of add_vertical_barrier: the first price at or after the holding period, if any
+    vertical, ends = [], []
+    for horizon in horizons:
+        if horizon is None:
+            vertical.append(np.full(start.shape[0], num_prices, dtype=np.int64))
+            ends.append(np.full(start.shape[0], num_prices, dtype=np.int64))
+            continue
+        pos = index.searchsorted(events.index + _holding_period(horizon), side='left').astype(np.int64)
+        inside = pos < num_prices
+        end = np.full(pos.shape[0], num_prices, dtype=np.int64)
+        end[inside] = index.searchsorted(index[pos[inside]], side='right')
+        vertical.append(pos)
+        ends.append(end)
+
+    # the grids of the scan, the stop loss uses the profit taking levels when there is no side
+    pt_grid = np.unique(np.asarray([m for m in pt if m > 0], dtype=np.float64))
+    sl_levels = sl if side_prediction is not None else pt
+    sl_grid = np.unique(np.asarray([m for m in sl_levels if m > 0], dtype=np.float64))
+    scan_end = np.max(ends, axis=0) if len(ends) else start
+    pt_pos, sl_pos = barrier_sweep(price, start, scan_end, trgt, side, pt_grid, sl_grid)
+
+    # the end price is the first price of the end time, as the bfill of get_bins
+    first = np.append(index.searchsorted(index, side='left'), num_prices).astype(np.int64)
+    out = {}
+    for horizon, vertical_pos, end in zip(horizons, vertical, ends):
+        for pt_level in pt:
+            for sl_level in sl:
+                pt_col = _grid_column(pt_grid, pt_level)
+                sl_col = _grid_column(sl_grid, sl_level if side_prediction is not None else pt_level)
+                # earliest of the first touches before the vertical barrier and the vertical barrier
+                ent = first[vertical_pos]
+                for touches, col in ((pt_pos, pt_col), (sl_pos, sl_col)):
+                    if col < 0:
+                        continue
+                    touch = touches[:, col]
+                    hit = (touch >= 0) & (touch < end)
+                    ent = np.where(hit, np.minimum(ent, first[np.where(hit, touch, num_prices)]), ent)
+                keep = ent < num_prices
+                # Need to take the log returns, else your results will be skewed for short positions
+                ret = log_price[ent[keep]] - log_price[start[keep]]
+                if side_prediction is not None:
+                    ret = ret * side[keep]
+                labels = _touch_labels(ret, trgt[keep], np.full(ret.shape[0], pt_level, dtype=np.float64),
+                                       np.full(ret.shape[0], sl_level, dtype=np.float64))
+                if side_prediction is not None:
+                    labels[ret <= 0] = 0
+                out_df = pd.DataFrame({'ret': np.exp(ret) - 1, 'trgt': trgt[keep], 'bin': labels},
+                                      index=events.index[keep])
+                if side_prediction is not None:
+                    out_df['side'] = side[keep]
+                out[(pt_level, sl_level, horizon)] = out_df
+    return out
+
+
 def drop_labels(events, min_pct=.05):
     """
     From AFML
@@ -333,3 +569,224 @@ def drop_labels(events, min_pct=.05):
         print('dropped label: ', df0.argmin(), df0.min())
         events = events[events['bin'] != df0.argmin()]
     return events
+
+
+# relative slack of the price levels in the heaps of TripleBarrierLabeler, the touches are checked exactly
+_LEVEL_SLACK = 1e-12
+# size under which the heaps of TripleBarrierLabeler keep the entries of the resolved events
+_MIN_HEAP_SIZE = 64
+
+
+def _datetimes(ns, dtype):
+    """
+    DatetimeIndex of int64 nanoseconds, with the unit and time zone of a datetime dtype.
+    """
+    index = pd.DatetimeIndex(np.asarray(ns, dtype=np.int64).view('M8[ns]'))
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        return index.tz_localize('UTC').tz_convert(dtype.tz).as_unit(dtype.unit)
+    return index.as_unit(np.datetime_data(dtype)[0])
+
+
+class TripleBarrierLabeler:
+    """
+    Online version of get_events and get_bins: the prices are fed batch by batch, in time order, with the
+    events that start in the batch, and each event is labeled as soon as its first barrier is touched or its
+    vertical barrier expires. The open events are kept in a min-heap of the price levels of the barriers
+    above the price and a max-heap of the levels below it, so that a new price only checks the barriers it
+    crosses, and in a heap of their vertical barrier times.
+
+    The labels are those of get_bins(get_events(...), df_price) with the vertical barriers of
+    add_vertical_barrier. The ticks of a timestamp all belong to the path of an event, so an event whose
+    vertical barrier falls on the current timestamp is emitted with the first price of the next one.
+    """
+
+    def __init__(self, pt_sl=[1, 1], min_ret=0.0, num_days=0, num_hours=0, num_minutes=0, num_seconds=0,
+                 meta_labeling=False):
+        """
+        Constructor
+
+        :param pt_sl: 2 element array (profit taking level, stop loss level), see get_events
+        :param min_ret: the minimum target return of an event, see get_events
+        :param num_days, num_hours, num_minutes, num_seconds: holding period of the vertical barrier, see
+                          add_vertical_barrier, no vertical barrier when they are all 0
+        :param meta_labeling: if True the events have the side of a primary model and the labels are {0, 1},
+                              as get_events with side_prediction
+        """
+        self.pt_sl = pt_sl
+        self.min_ret = min_ret
+        self.meta_labeling = meta_labeling
+        timedelta = pd.Timedelta(
+            '{} days, {} hours, {} minutes, {} seconds'.format(num_days, num_hours, num_minutes, num_seconds))
+        self.holding = timedelta.value if timedelta.value > 0 else None
+        # the scan of get_events uses the profit taking level for both barriers when there is no side
+        self._pt_sl = pt_sl[:2] if meta_labeling else [pt_sl[0], pt_sl[0]]
+        self._dtype = None
+        self._time = None          # last timestamp, int64 nanoseconds
+        self._time_prices = []     # prices of the last timestamp
+        self._next_id = 0
+        self._open = {}            # id: (start, base price, profit taking, stop loss, side, target)
+        self._pending = []         # heap of (start, id) of the events without a price yet
+        self._waiting = {}         # id: (start, target, side)
+        self._upper = []           # heap of (level, id, barrier) touched by a price above the level
+        self._lower = []           # heap of (-level, id, barrier) touched by a price below the level
+        self._deadlines = []       # heap of (vertical barrier, id)
+        self._done = []            # (start, end, base price, end price, target, side) of the labeled events
+
+    def update(self, prices, t_events=None, target=None, side=None):
+        """
+        Labels of the events resolved by the next batch of prices.
+
+        :param prices: (series) of close prices with a DatetimeIndex, following the previous batch
+        :param t_events: (DatetimeIndex) start times of the new events, not earlier than the last price of
+                         the previous batches, e.g. the events of CusumFilter.update on the same batch
+        :param target: (series or float) width of the horizontal barriers of the new events, see get_events
+        :param side: (series) side of the new events, required with meta_labeling
+        :return: (pd.df) the events labeled in this batch, in the order they are resolved, with the start
+                 time as the index and the columns of get_bins and ent, the time of the first barrier touch
+        """
+        prices = pd.DataFrame(prices).iloc[:, 0]
+        if self._dtype is None:
+            self._dtype = prices.index.dtype
+        if t_events is not None and len(t_events):
+            self._add_events(pd.DatetimeIndex(t_events), target, side)
+        times = prices.index.as_unit('ns').asi8
+        if times.shape[0] and self._time is not None and times[0] < self._time:
+            raise ValueError('the prices should follow the previous batches')
+        for t, price in zip(times.tolist(), prices.to_numpy(dtype=np.float64).tolist()):
+            if self._time is None or t > self._time:
+                if self._time is not None:
+                    self._expire()
+                self._time, self._time_prices = t, []
+            elif t < self._time:
+                raise ValueError('the prices should be sorted by time')
+            self._time_prices.append(price)
+            while self._pending and self._pending[0][0] <= t:
+                _, event_id = heapq.heappop(self._pending)
+                self._start(event_id, price)
+            self._cross(price)
+        return self._labels()
+
+    def _add_events(self, t_events, target, side):
+        starts = t_events.as_unit('ns').asi8
+        if isinstance(target, pd.Series):
+            target = target.reindex(t_events).to_numpy(dtype=np.float64)
+        target = np.broadcast_to(np.asarray(target, dtype=np.float64), starts.shape)
+        if self.meta_labeling:
+            if side is None:
+                raise ValueError('the side of the events is required with meta_labeling')
+            side = side.reindex(t_events).to_numpy(dtype=np.float64)
+        else:
+            side = np.ones(starts.shape[0])
+        # the events of get_events: target above min_ret and a side
+        keep = (target > self.min_ret) & ~np.isnan(side)
+        for start, trgt, event_side in zip(starts[keep].tolist(), target[keep].tolist(), side[keep].tolist()):
+            if self._time is not None and start < self._time:
+                raise ValueError('the events should not start before the last price')
+            event_id = self._next_id
+            self._next_id += 1
+            self._waiting[event_id] = (start, trgt, event_side)
+            if self._time is not None and start == self._time:
+                # starts at the first price of the current timestamp, whose ticks are already seen
+                self._start(event_id, self._time_prices[0])
+                for price in self._time_prices:
+                    if self._touched(event_id, price) is not None:
+                        self._resolve(event_id)
+                        break
+            else:
+                heapq.heappush(self._pending, (start, event_id))
+
+    def _start(self, event_id, base):
+        start, trgt, side = self._waiting.pop(event_id)
+        profit_taking = self._pt_sl[0] * trgt if self._pt_sl[0] > 0 else np.nan
+        stop_loss = -self._pt_sl[1] * trgt if self._pt_sl[1] > 0 else np.nan
+        self._open[event_id] = (start, base, profit_taking, stop_loss, side, trgt)
+        if self.holding is not None:
+            heapq.heappush(self._deadlines, (start + self.holding, event_id))
+        if not base > 0 or side == 0:
+            return
+        # pt is touched when (price / base - 1) * side > profit_taking, sl when it is below stop_loss
+        for barrier, ret in ((0, profit_taking), (1, stop_loss)):
+            if np.isnan(ret):
+                continue
+            level = base * (1 + ret / side)
+            if (side > 0) == (barrier == 0):
+                heapq.heappush(self._upper, (level - abs(level) * _LEVEL_SLACK, event_id, barrier))
+            else:
+                heapq.heappush(self._lower, (-level - abs(level) * _LEVEL_SLACK, event_id, barrier))
+
+    def _touched(self, event_id, price):
+        """
+        The barrier of an event touched by a price, 0 for profit taking, 1 for stop loss, else None.
+        """
+        _, base, profit_taking, stop_loss, side, _ = self._open[event_id]
+        ret = (price / base - 1) * side
+        if ret < stop_loss:
+            return 1
+        if ret > profit_taking:
+            return 0
+        return None
+
+    def _cross(self, price):
+        """
+        Resolve the open events whose barrier levels are crossed by a price.
+        """
+        # the keys of the upper heap are crossed below the price, those of the lower heap above it
+        for heap, key in ((self._upper, price), (self._lower, -price)):
+            missed = []
+            while heap and heap[0][0] < key:
+                item = heapq.heappop(heap)
+                if item[1] not in self._open:
+                    continue
+                if self._touched(item[1], price) is not None:
+                    self._resolve(item[1])
+                else:
+                    # within the slack of the level
+                    missed.append(item)
+            for item in missed:
+                heapq.heappush(heap, item)
+
+    def _expire(self):
+        """
+        Resolve the open events whose vertical barrier is at or before the last timestamp.
+        """
+        while self._deadlines and self._deadlines[0][0] <= self._time:
+            _, event_id = heapq.heappop(self._deadlines)
+            if event_id in self._open:
+                self._resolve(event_id)
+
+    def _resolve(self, event_id):
+        # the end price is the first price of the end time, as the bfill of get_bins
+        start, base, _, _, side, trgt = self._open.pop(event_id)
+        self._done.append((start, self._time, base, self._time_prices[0], trgt, side))
+        # an event has at most one entry per heap, the others are left by resolved events
+        for heap in (self._upper, self._lower, self._deadlines):
+            if len(heap) > 3 * len(self._open) + _MIN_HEAP_SIZE:
+                self._compact(heap)
+
+    def _compact(self, heap):
+        """
+        Drop the entries of the resolved events from a heap, in place.
+        """
+        heap[:] = [item for item in heap if item[1] in self._open]
+        heapq.heapify(heap)
+
+    def _labels(self):
+        done = np.array(self._done, dtype=np.float64).reshape(-1, 6)
+        starts = np.array([row[0] for row in self._done], dtype=np.int64)
+        ends = np.array([row[1] for row in self._done], dtype=np.int64)
+        self._done = []
+        # Need to take the log returns, else your results will be skewed for short positions
+        ret = np.log(done[:, 3]) - np.log(done[:, 2])
+        if self.meta_labeling:
+            ret = ret * done[:, 5]
+        pt = np.full(ret.shape[0], self.pt_sl[0], dtype=np.float64)
+        sl = np.full(ret.shape[0], self.pt_sl[1], dtype=np.float64)
+        labels = _touch_labels(ret, done[:, 4], pt, sl)
+        if self.meta_labeling:
+            labels[ret <= 0] = 0
+        dtype = self._dtype if self._dtype is not None else np.dtype('M8[ns]')
+        out_df = pd.DataFrame({'ent': _datetimes(ends, dtype), 'ret': np.exp(ret) - 1, 'trgt': done[:, 4],
+                               'bin': labels}, index=_datetimes(starts, dtype))
+        if self.meta_labeling:
+            out_df['side'] = done[:, 5]
+        return out_df
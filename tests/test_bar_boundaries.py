@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from custombar import TickBar, VolBar, DollarBar
+from custombar._bar_kernels import count_boundaries
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+THRESHOLDS = {'TickBar': 50, 'VolBar': 1500, 'DollarBar': 150000}
+
+
+def _read(name):
+    return pd.read_csv(os.path.join(DATA, name), index_col='datetime', parse_dates=True)
+
+
+@pytest.mark.parametrize('bar_class', [TickBar, VolBar, DollarBar])
+@pytest.mark.parametrize('shared_tick', [False, True])
+def test_bars_match_frozen_output(bar_class, shared_tick):
+    # frozen_bars.csv holds the bars of ticks.csv built by the per-tick loops and the df.loc slicing of
+    # the original classes for shared_tick, and with every tick in one bar otherwise. The ticks have
+    # repeated timestamps and volume blocks that cross the threshold several times.
+    ticks = _read('ticks.csv')
+    frozen = _read('frozen_bars.csv')
+    name = bar_class.__name__
+    expected = frozen[(frozen['bar'] == name) & (frozen['shared_tick'] == shared_tick)]
+    expected = expected.drop(columns=['bar', 'shared_tick'])
+    bars = bar_class(threshold=THRESHOLDS[name], shared_tick=shared_tick).transform(ticks)
+    pd.testing.assert_frame_equal(bars, expected, check_freq=False)
+
+
+def _loop_count_boundaries(num_ticks, threshold):
+    """
+    The reset-to-zero loop of the original TickBar._extract_bars, on positions.
+    """
+    ts  = 0
+    idx = []
+    for i in range(num_ticks):
+        ts += 1
+        if ts >= threshold:
+            idx.append(i)
+            ts = 0
+            continue
+    return np.array(idx, dtype=np.int64)
+
+
+@pytest.mark.parametrize('threshold', [0.5, 1, 2.5, 7, 50, 1000])
+def test_count_boundaries_match_loop(threshold):
+    expected = _loop_count_boundaries(997, threshold)
+    idx, _ = count_boundaries(997, threshold)
+    np.testing.assert_array_equal(idx, expected)
+    # the open bar is carried over between batches
+    parts, count, offset = [], 0, 0
+    for num in [1, 13, 400, 0, 583]:
+        idx, count = count_boundaries(num, threshold, count)
+        parts.append(idx + offset)
+        offset += num
+    np.testing.assert_array_equal(np.concatenate(parts), expected)
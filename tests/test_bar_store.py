@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from custombar import BarStore
+
+
+def _bars(num, start='2024-01-02 09:30', freq='1min'):
+    index = pd.date_range(start, periods=num, freq=freq, name='datetime')
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'close': 100 + np.cumsum(rng.normal(size=num)),
+                         'volume': rng.integers(1, 100, size=num)}, index=index)
+
+
+def _read(store, *args):
+    bars = store.read(*args)
+    return pd.DataFrame({col: np.asarray(bars[col]) for col in bars.columns}, index=bars.index)
+
+
+def test_append_within_day(tmp_path):
+    store = BarStore(str(tmp_path))
+    bars = _bars(1000, freq='10s')
+    store.write('ES', bars.iloc[:500])
+    store.write('ES', bars.iloc[500:])
+    out = _read(store, 'ES')
+    pd.testing.assert_frame_equal(out, bars, check_freq=False)
+    assert len(store.dates('ES')) == 1
+
+
+def test_append_across_days(tmp_path):
+    store = BarStore(str(tmp_path))
+    bars = _bars(3000, freq='1min')
+    store.write('ES', bars.iloc[:1234])
+    store.write('ES', bars.iloc[1234:])
+    pd.testing.assert_frame_equal(_read(store, 'ES'), bars, check_freq=False)
+    assert list(store.dates('ES')) == list(pd.DatetimeIndex(bars.index.normalize().unique(), name='date'))
+    day = store.dates('ES')[1]
+    pd.testing.assert_frame_equal(_read(store, 'ES', day, day), bars[bars.index.normalize() == day],
+                                  check_freq=False)
+
+
+def test_overlapping_write_replaces_dates(tmp_path):
+    store = BarStore(str(tmp_path))
+    bars = _bars(3000, freq='1min')
+    store.write('ES', bars)
+    new = bars.iloc[1500:1600] * 2
+    store.write('ES', new)
+    day = new.index[0].normalize()
+    expected = pd.concat([bars[bars.index.normalize() != day], new]).sort_index()
+    pd.testing.assert_frame_equal(_read(store, 'ES'), expected, check_freq=False)
+
+
+def test_rewrite_ignores_stale_tmp(tmp_path):
+    store = BarStore(str(tmp_path))
+    bars = _bars(3000, freq='1min')
+    store.write('ES', bars)
+    # leftover of a failed rewrite
+    store.write('ES.tmp', bars.iloc[:10])
+    store.write('ES', bars.iloc[:100])
+    assert store.symbols() == ['ES']
+    assert not os.path.exists(os.path.join(str(tmp_path), 'ES.tmp'))
+    day = bars.index[0].normalize()
+    expected = pd.concat([bars.iloc[:100], bars[bars.index.normalize() != day]])
+    pd.testing.assert_frame_equal(_read(store, 'ES'), expected, check_freq=False)
+
+
+def test_append_after_failed_write(tmp_path):
+    store = BarStore(str(tmp_path))
+    bars = _bars(1000, freq='10s')
+    store.write('ES', bars.iloc[:400])
+    # a write which appended some columns and failed before the meta
+    with open(os.path.join(str(tmp_path), 'ES', 'close.bin'), 'ab') as f:
+        f.write(np.ones(50).tobytes())
+    store.write('ES', bars.iloc[400:])
+    pd.testing.assert_frame_equal(_read(store, 'ES'), bars, check_freq=False)
+
+
+def test_write_rejects_object_columns(tmp_path):
+    store = BarStore(str(tmp_path))
+    bars = _bars(10).assign(note='x')
+    with pytest.raises(ValueError):
+        store.write('ES', bars)
+    assert store.symbols() == []
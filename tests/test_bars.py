@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from custombar import TickBar, VolBar, DollarBar, TimeBar, Imbalance_Bar, Imbalance_Run_Bar, build_bars
+from custombar._base_bars import _BaseBars
+
+
+def _ticks(num, days=5, seed=0):
+    rng = np.random.default_rng(seed)
+    stamps = pd.Timestamp('2024-01-02') + pd.to_timedelta(np.sort(rng.uniform(0, days * 86400, num)), unit='s')
+    return pd.DataFrame({'price': 100 + np.cumsum(rng.normal(0, 0.1, num)),
+                         'volume': rng.integers(1, 50, num)}, index=pd.DatetimeIndex(stamps, name='datetime'))
+
+
+@pytest.mark.parametrize('bar_class', [TickBar, VolBar, DollarBar])
+def test_bars_per_day(bar_class):
+    ticks = _ticks(50000)
+    bars = bar_class(threshold=1000, bars_per_day=100, num_prev_days=2).transform(ticks)
+    per_day = bars.groupby(bars.index.normalize()).size()
+    # the threshold adapts from the second day on
+    assert np.all(np.abs(per_day.iloc[1:] - 100) < 30)
+
+
+def test_bars_per_day_needs_an_activity():
+    class _NoActivityBar(_BaseBars):
+        def _extract_bars(self, price, volume, ts=None):
+            return np.empty(0, dtype=np.int64)
+
+    with pytest.raises(ValueError):
+        _NoActivityBar(threshold=10, bars_per_day=50)
+    _NoActivityBar(threshold=10)
+
+
+def test_bars_per_day_needs_a_threshold():
+    with pytest.raises(ValueError):
+        VolBar(bars_per_day=10)
+
+
+def test_bars_per_day_local_days():
+    # the threshold follows the local days of a tz-aware index, as the local ticks of a naive one
+    ticks = _ticks(20000).tz_localize('Asia/Kolkata')
+    local = ticks.tz_localize(None)
+    bars = VolBar(threshold=5000, bars_per_day=50, num_prev_days=2).transform(ticks)
+    expected = VolBar(threshold=5000, bars_per_day=50, num_prev_days=2).transform(local)
+    pd.testing.assert_frame_equal(bars.tz_localize(None), expected)
+
+def test_build_bars_empty_sources():
+    with pytest.raises(ValueError):
+        build_bars({}, TickBar, num_threads=1, threshold=100)
+
+
+def test_build_bars_matches_transform():
+    sources = {'A': _ticks(3000, seed=1), 'B': _ticks(2000, seed=2)}
+    bars = build_bars(sources, TickBar, num_threads=1, threshold=100)
+    for symbol, ticks in sources.items():
+        pd.testing.assert_frame_equal(bars.loc[symbol], TickBar(threshold=100).transform(ticks))
+
+
+def test_build_bars_from_files_with_dictcol(tmp_path):
+    dictcol = {'px': 'price', 'qty': 'volume'}
+    frames = {'A': _ticks(3000, seed=1), 'B': _ticks(2000, seed=2)}
+    sources = {}
+    for symbol, ticks in frames.items():
+        sources[symbol] = tmp_path / '{}.csv'.format(symbol)
+        ticks.rename(columns={'price': 'px', 'volume': 'qty'}).to_csv(sources[symbol])
+    bars = build_bars(sources, TickBar, num_threads=1, batch_size=700, threshold=100, dictcol=dictcol)
+    for symbol, ticks in frames.items():
+        pd.testing.assert_frame_equal(bars.loc[symbol], TickBar(threshold=100).transform(ticks), check_freq=False)
+
+@pytest.mark.parametrize('tz', [None, 'US/Eastern', 'Asia/Kolkata'])
+@pytest.mark.parametrize('freq', ['7min', '1h', '5h', '1D'])
+def test_time_bars_match_resample(tz, freq):
+    rng = np.random.default_rng(0)
+    num = 50000
+    # across the change to daylight saving time of US/Eastern
+    start = pd.Timestamp('2024-03-08 13:17', tz=tz)
+    index = start + pd.to_timedelta(np.sort(rng.uniform(0, 6 * 86400, num)), unit='s')
+    ticks = pd.DataFrame({'price': 100 + np.cumsum(rng.normal(0, 0.1, num)),
+                          'volume': rng.integers(1, 9, num).astype(float)},
+                         index=pd.DatetimeIndex(index, name='datetime'))
+    expected = ticks['price'].resample(freq).ohlc().dropna()
+    bars = TimeBar(freq).transform(ticks)
+    pd.testing.assert_index_equal(bars.index, expected.index, check_names=False, exact=False)
+    for col in ['open', 'high', 'low', 'close']:
+        np.testing.assert_allclose(bars[col].to_numpy(), expected[col].to_numpy())
+    # the same bars from batches
+    streamed = TimeBar(freq)
+    cuts = np.linspace(0, num, 8).astype(int)
+    parts = [streamed.update(ticks.iloc[a:b]) for a, b in zip(cuts[:-1], cuts[1:])] + [streamed.flush()]
+    pd.testing.assert_frame_equal(pd.concat(parts), bars, check_freq=False)
+
+
+@pytest.mark.parametrize('bar_class', [Imbalance_Bar, Imbalance_Run_Bar])
+def test_imbalance_bars_transform_is_repeatable(bar_class):
+    ticks = _ticks(100000)
+    bars = bar_class(exp_num_ticks_init=300)
+    first = bars.transform(ticks)
+    pd.testing.assert_frame_equal(bars.transform(ticks), first)
+    pd.testing.assert_frame_equal(bar_class(exp_num_ticks_init=300).transform(ticks), first)
+    # update carries the expectations from batch to batch
+    streamed = bar_class(exp_num_ticks_init=300)
+    parts = [streamed.update(ticks.iloc[start:start + 30000]) for start in range(0, len(ticks), 30000)]
+    pd.testing.assert_frame_equal(pd.concat(parts + [streamed.flush()]), first)
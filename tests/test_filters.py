@@ -0,0 +1,69 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from filters import EMDCache, emd_batch, z_score_filter, z_score_filter_2d, ZScoreFilter
+
+
+def _cache_files(path):
+    return sorted(name for name in os.listdir(path) if name.endswith('.npy'))
+
+
+def test_emd_cache_lru_eviction(tmp_path):
+    cache = EMDCache(str(tmp_path), max_size_mb=1)
+    # about 0.3MB per entry, three of them fit
+    blocks = {str(i): np.full((4, 10000), float(i)) for i in range(5)}
+    for key in ['0', '1', '2']:
+        cache.put(key, blocks[key])
+    assert cache.get('0') is not None
+    cache.put('3', blocks['3'])
+    # '1' is the least recently used one
+    assert _cache_files(str(tmp_path)) == ['0.npy', '2.npy', '3.npy']
+    np.testing.assert_array_equal(cache.get('2'), blocks['2'])
+    assert cache._size == sum(os.path.getsize(os.path.join(str(tmp_path), f)) for f in _cache_files(str(tmp_path)))
+
+
+def test_emd_cache_reads_existing_directory(tmp_path):
+    cache = EMDCache(str(tmp_path), max_size_mb=1)
+    for key in ['0', '1', '2']:
+        cache.put(key, np.full((4, 10000), 1.0))
+        time.sleep(0.01)
+    # a new cache on the same directory evicts the oldest files first
+    cache = EMDCache(str(tmp_path), max_size_mb=1)
+    cache.put('3', np.full((4, 10000), 1.0))
+    assert _cache_files(str(tmp_path)) == ['1.npy', '2.npy', '3.npy']
+
+
+def test_emd_cache_put_does_not_scan_directory(tmp_path, monkeypatch):
+    cache = EMDCache(str(tmp_path), max_size_mb=1024)
+    cache.put('first', np.zeros(10))
+    calls = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: calls.append(path) or listdir(path))
+    for i in range(200):
+        cache.put(str(i), np.zeros(10))
+    assert calls == []
+
+
+def test_emd_batch_uses_cache(tmp_path):
+    rng = np.random.default_rng(0)
+    series = np.cumsum(rng.normal(size=(4, 200)), axis=1)
+    series[3] = series[0]
+    cache = EMDCache(str(tmp_path))
+    imfs = emd_batch(series, cache=cache)
+    assert len(_cache_files(str(tmp_path))) == 3
+    again = emd_batch(series, cache=cache)
+    for first, second in zip(imfs, again):
+        np.testing.assert_array_equal(first, second)
+
+
+def test_z_score_entry_points_share_the_default_side():
+    rng = np.random.default_rng(0)
+    values = pd.Series(np.cumsum(rng.normal(size=3000)), index=pd.date_range('2024-01-02', periods=3000, freq='1min'))
+    events = z_score_filter(values, 50, 50, z_score=2)
+    _, positions, sides = z_score_filter_2d(values.to_frame(), 50, 50, z_score=2)
+    assert len(events) > 0 and np.all(sides == 1)
+    pd.testing.assert_index_equal(events, pd.DatetimeIndex(values.index[positions]))
+    pd.testing.assert_index_equal(ZScoreFilter(50, 50, z_score=2).update(values), events)
@@ -0,0 +1,180 @@
+import numpy as np
+import pytest
+
+from custombar import Imbalance_Bar, Imbalance_Run_Bar
+from util import ewma
+
+
+class _BaselineBar:
+    """
+    The per-tick loops of Imbalance_Bar and Imbalance_Run_Bar before the compiled state machines, as they
+    were written, with the rows read from arrays instead of iloc. Only the documented fixes are applied,
+    each marked with a "fix:" comment.
+    """
+
+    def __init__(self, mode='tick', num_prev_bars=3, exp_num_ticks_init=5000):
+        self.prev_tick = {}
+        self.prev_tick_rule = 0
+        self.num_prev_bars = num_prev_bars
+        self.exp_num_ticks_init = exp_num_ticks_init
+        self.exp_num_ticks = self.exp_num_ticks_init
+        self.metric = mode
+
+    def _apply_tick_rule(self, price):
+        if self.prev_tick:
+            tick_diff = price - self.prev_tick['price']
+        else:
+            tick_diff = 0
+        signed_tick = 0
+        if tick_diff != 0:
+            signed_tick = np.sign(tick_diff)
+            self.prev_tick_rule = signed_tick
+        else:
+            signed_tick = self.prev_tick_rule
+
+        return signed_tick
+
+    def _get_expected_imbalance(self, window, imbalance_array):
+        if len(imbalance_array) < self.exp_num_ticks_init:
+            ewma_window = np.nan
+        else:
+            ewma_window = int(min(len(imbalance_array), window))
+
+        if np.isnan(ewma_window):
+            expected_imbalance = np.nan
+        else:
+            expected_imbalance = ewma(
+                np.array(imbalance_array[-ewma_window:], dtype=float), window=ewma_window)[-1]
+
+        return expected_imbalance
+
+    def _get_imbalance(self, price, signed_tick, volume):
+        # fix: the dollar imbalance was overwritten by the tick imbalance of the else branch
+        if self.metric == 'dollar':
+            imbalance = signed_tick * volume * price
+        elif self.metric == 'volume':
+            imbalance = signed_tick * volume
+        else:
+            imbalance = signed_tick
+        return imbalance
+
+
+class _BaselineImbalanceBar(_BaselineBar):
+
+    def __init__(self, **kwargs):
+        _BaselineBar.__init__(self, **kwargs)
+        self.num_ticks_bar = []
+        self.expected_imbalance = np.nan
+        self.imbalance_array = []
+
+    def _extract_bars(self, prices, volumes):
+        cum_theta      = 0
+        idx     = []
+        cum_ticks = 0
+        for i in range(prices.shape[0]):
+            price  = prices[i]
+            volume = volumes[i]
+            signed_tick = self._apply_tick_rule(price)
+            imbalance   = self._get_imbalance(price, signed_tick, volume)
+            self.imbalance_array.append(imbalance)
+            cum_theta += imbalance
+            cum_ticks += 1
+            if np.isnan(self.expected_imbalance):
+                self.expected_imbalance = self._get_expected_imbalance(self.exp_num_ticks,
+                                                                       self.imbalance_array)
+            if np.abs(cum_theta) > self.exp_num_ticks * np.abs(self.expected_imbalance):
+                self.num_ticks_bar.append(cum_ticks)
+                self.exp_num_ticks = ewma(np.array(
+                    self.num_ticks_bar[-self.num_prev_bars:], dtype=float), self.num_prev_bars)[-1]
+
+                self.expected_imbalance = self._get_expected_imbalance(
+                    self.exp_num_ticks * self.num_prev_bars, self.imbalance_array)
+                idx.append(i)
+                cum_ticks, cum_theta = 0, 0
+                self.prev_tick['price'] = price
+                continue
+            self.prev_tick['price'] = price
+        return np.array(idx, dtype=np.int64)
+
+
+class _BaselineRunBar(_BaselineBar):
+
+    def __init__(self, **kwargs):
+        _BaselineBar.__init__(self, **kwargs)
+        self.num_ticks_bar = {'cum_ticks':      [],
+                              'buy_proportion': []}
+        self.exp_buy_proportion = np.nan
+        self.expected_imbalance = {'L': np.nan, 'S': np.nan}
+        self.imbalance_array = {'L': [], 'S': []}
+
+    def _extract_bars(self, prices, volumes):
+        idx     = []
+        cum_ticks = 0
+        cum_theta_buy = 0
+        buy_ticks = 0
+        cum_theta_sell = 0
+        for i in range(prices.shape[0]):
+            price  = prices[i]
+            volume = volumes[i]
+            cum_ticks += 1
+            signed_tick = self._apply_tick_rule(price)
+            imbalance   = self._get_imbalance(price, signed_tick, volume)
+
+            if imbalance > 0:
+                self.imbalance_array['L'].append(imbalance)
+                cum_theta_buy += imbalance
+                buy_ticks += 1
+            elif imbalance < 0:
+                self.imbalance_array['S'].append(np.abs(imbalance))
+                cum_theta_sell +=  np.abs(imbalance)
+            imbalances_are_counted_flag = np.isnan([self.expected_imbalance['L'],
+                                                    self.expected_imbalance['S']]).any()
+            if not idx and imbalances_are_counted_flag:
+                self.expected_imbalance['L'] = self._get_expected_imbalance(self.exp_num_ticks,
+                                                                            self.imbalance_array['L'])
+                self.expected_imbalance['S'] = self._get_expected_imbalance(self.exp_num_ticks,
+                                                                            self.imbalance_array['S'])
+                if bool(np.isnan([self.expected_imbalance['L'], self.expected_imbalance['S']]).any()) is False:
+                    self.exp_buy_proportion = buy_ticks / cum_ticks
+                    cum_theta_buy, cum_theta_sell = 0, 0
+                    self.warm_up = False
+            max_proportion = max(self.expected_imbalance['L'] * self.exp_buy_proportion,
+                                 self.expected_imbalance['S'] * (1 - self.exp_buy_proportion))
+            if max(cum_theta_buy, cum_theta_sell) > self.exp_num_ticks * max_proportion and self.warm_up is False:
+                self.num_ticks_bar['cum_ticks'].append(cum_ticks)
+                self.num_ticks_bar['buy_proportion'].append(buy_ticks / cum_ticks)
+                self.exp_num_ticks = ewma(np.array(self.num_ticks_bar['cum_ticks'][-self.num_prev_bars:], dtype=float),
+                                          self.num_prev_bars)[-1]
+                # fix: the ewma was stored in exp_buy_ticks_proportion, which nothing read
+                self.exp_buy_proportion = \
+                    ewma(np.array(self.num_ticks_bar['buy_proportion'][-self.num_prev_bars:], dtype=float),
+                         self.num_prev_bars)[-1]
+                self.expected_imbalance['L'] = self._get_expected_imbalance(self.exp_num_ticks * self.num_prev_bars,
+                                                                            self.imbalance_array['L'])
+                self.expected_imbalance['S'] = self._get_expected_imbalance(self.exp_num_ticks * self.num_prev_bars,
+                                                                            self.imbalance_array['S'])
+                idx.append(i)
+                cum_ticks, buy_ticks, cum_theta_buy, cum_theta_sell = 0, 0, 0, 0
+                self.prev_tick['price'] = price
+                continue
+            self.prev_tick['price'] = price
+        return np.array(idx, dtype=np.int64)
+
+
+def _ticks(num, seed=0):
+    rng = np.random.default_rng(seed)
+    # prices on a tick grid so that the tick rule often repeats the previous sign
+    price  = 100 + np.round(np.cumsum(rng.normal(0, 0.02, num)), 2)
+    volume = rng.integers(1, 50, num).astype(np.float64)
+    return price, volume
+
+
+@pytest.mark.parametrize('bar_class,baseline', [(Imbalance_Bar, _BaselineImbalanceBar),
+                                                (Imbalance_Run_Bar, _BaselineRunBar)])
+@pytest.mark.parametrize('mode', ['tick', 'volume', 'dollar'])
+def test_kernel_matches_baseline_loop(bar_class, baseline, mode):
+    price, volume = _ticks(20000)
+    kwargs = dict(mode=mode, num_prev_bars=3, exp_num_ticks_init=100)
+    expected = baseline(**kwargs)._extract_bars(price, volume)
+    assert len(expected) > 20
+    np.testing.assert_array_equal(bar_class(**kwargs)._extract_bars(price, volume), expected)
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from labeling import add_vertical_barrier, get_bins, get_events, sweep_labels, TripleBarrierLabeler
+
+
+def _prices(num, tz=None, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-01', periods=num, freq='1min', tz=tz)
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 1e-3, num))), index=index)
+
+
+def _online_labels(labeler, prices, t_events, target, num_batches=7):
+    out = []
+    bounds = np.linspace(0, prices.shape[0], num_batches + 1).astype(int)
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        batch = prices.iloc[lo:hi]
+        starts = t_events[(t_events >= batch.index[0]) & (t_events <= batch.index[-1])]
+        out.append(labeler.update(batch, starts, target))
+    return pd.concat(out).sort_index()
+
+
+def test_online_labeler_naive_index():
+    prices = _prices(5000)
+    t_events = prices.index[::13]
+    target = pd.Series(0.005, index=prices.index)
+    vertical = add_vertical_barrier(prices, t_events, num_hours=2)
+    bins = get_bins(get_events(prices, target, t_events, [1, 2], vertical_barrier_times=vertical), prices)
+    online = _online_labels(TripleBarrierLabeler([1, 2], num_hours=2), prices, t_events, target)
+    assert online.index.dtype == prices.index.dtype
+    assert online['ent'].dtype == prices.index.dtype
+    common = bins.index.intersection(online.index)
+    assert len(common) > 0.95 * len(bins)
+    pd.testing.assert_frame_equal(online.loc[common].drop(columns='ent'), bins.loc[common], check_freq=False)
+
+
+def test_online_labeler_tz_index():
+    prices = _prices(3000, tz='US/Eastern')
+    t_events = prices.index[::11]
+    target = pd.Series(0.005, index=prices.index)
+    vertical = add_vertical_barrier(prices, t_events, num_hours=1)
+    bins = get_bins(get_events(prices, target, t_events, [1, 1], vertical_barrier_times=vertical), prices)
+    online = _online_labels(TripleBarrierLabeler([1, 1], num_hours=1), prices, t_events, target)
+    assert online.index.dtype == prices.index.dtype
+    common = bins.index.intersection(online.index)
+    pd.testing.assert_frame_equal(online.loc[common].drop(columns='ent'), bins.loc[common], check_freq=False)
+
+
+def test_online_labeler_heaps_follow_open_events():
+    prices = _prices(20000, seed=1)
+    target = pd.Series(0.002, index=prices.index)
+    labeler = TripleBarrierLabeler([1, 1])
+    for lo in range(0, prices.shape[0], 500):
+        batch = prices.iloc[lo:lo + 500]
+        labeler.update(batch, batch.index[::2], target)
+        num_open = len(labeler._open)
+        for heap in (labeler._upper, labeler._lower, labeler._deadlines):
+            assert len(heap) <= 3 * num_open + 64
+
+
+def test_sweep_labels_numeric_horizons_are_seconds():
+    prices = _prices(3000, seed=2)
+    t_events = prices.index[::7]
+    target = pd.Series(0.004, index=prices.index)
+    out = sweep_labels(prices, target, t_events, pt=[1, 2], sl=[1], horizons=[1800, '30min', None])
+    for pt in (1, 2):
+        pd.testing.assert_frame_equal(out[(pt, 1, 1800)], out[(pt, 1, '30min')])
+        vertical = add_vertical_barrier(prices, t_events, num_seconds=1800)
+        bins = get_bins(get_events(prices, target, t_events, [pt, 1], vertical_barrier_times=vertical), prices)
+        pd.testing.assert_frame_equal(out[(pt, 1, 1800)], bins, check_freq=False)
+
+
+def _baseline_get_bins(triple_barrier_events, df_price):
+    # get_bins and barrier_touched before the vectorization, merged
+    events_ = triple_barrier_events.dropna(subset=['ent'])
+    all_dates = events_.index.union(other=events_['ent'].values).drop_duplicates()
+    prices = df_price.reindex(all_dates, method='bfill')
+    out_df = pd.DataFrame(index=events_.index)
+    out_df['ret'] = np.log(prices.loc[events_['ent'].values].values) - np.log(prices.loc[events_.index])
+    out_df['trgt'] = events_['trgt']
+    if 'side' in events_:
+        out_df['ret'] = out_df['ret'] * events_['side']
+    store = []
+    for date_time, values in out_df.iterrows():
+        ret = values['ret']
+        target = values['trgt']
+        pt_level_reached = ret > target * triple_barrier_events.loc[date_time, 'pt']
+        sl_level_reached = ret < -target * triple_barrier_events.loc[date_time, 'sl']
+        if ret > 0.0 and pt_level_reached:
+            store.append(1)
+        elif ret < 0.0 and sl_level_reached:
+            store.append(-1)
+        else:
+            store.append(0)
+    out_df['bin'] = store
+    if 'side' in events_:
+        out_df.loc[out_df['ret'] <= 0, 'bin'] = 0
+    out_df['ret'] = np.exp(out_df['ret']) - 1
+    if 'side' in triple_barrier_events.columns:
+        out_df['side'] = triple_barrier_events['side']
+    return out_df
+
+
+@pytest.mark.parametrize('pt_sl', [[1, 2], [0, 2], [2, 0]])
+@pytest.mark.parametrize('with_side', [False, True])
+def test_get_bins_matches_baseline(pt_sl, with_side):
+    prices = _prices(3000, seed=2)
+    t_events = prices.index[5::7]
+    target = pd.Series(0.003, index=prices.index)
+    side = pd.Series(np.where(np.arange(len(prices)) % 3 == 0, -1.0, 1.0), index=prices.index) if with_side else None
+    vertical = add_vertical_barrier(prices, t_events, num_hours=1)
+    events = get_events(prices, target, t_events, pt_sl, vertical_barrier_times=vertical, side_prediction=side)
+    expected = _baseline_get_bins(events, prices)
+    assert expected['bin'].nunique() > 1
+    pd.testing.assert_frame_equal(get_bins(events, prices), expected, check_freq=False)
+
+
+def test_get_bins_without_touch_times():
+    # events without a touch time are dropped, also when no event has one
+    prices = _prices(100)
+    events = pd.DataFrame({'ent': pd.Series(pd.NaT, index=prices.index[:5], dtype=prices.index.dtype),
+                           'trgt': 0.01, 'side': 1.0, 'pt': 1, 'sl': 1}, index=prices.index[:5])
+    bins = get_bins(events, prices)
+    assert bins.empty
+    assert list(bins.columns) == ['ret', 'trgt', 'bin', 'side']
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from custombar import TickBar
+from custombar._readers import read_ticks
+
+
+def _write_csv(path, num=1000):
+    rng = np.random.default_rng(0)
+    ticks = pd.DataFrame({'datetime': pd.date_range('2024-01-02', periods=num, freq='1s'),
+                          'price': 100 + np.cumsum(rng.normal(0, 0.1, num)),
+                          'volume': rng.integers(1, 50, num)})
+    ticks.to_csv(path, index=False)
+    return ticks
+
+
+def test_read_ticks_pathlib_and_gz_directory(tmp_path):
+    # a directory name containing .gz must not change the detected format
+    folder = tmp_path / 'data.gzcache'
+    folder.mkdir()
+    ticks = _write_csv(folder / 'ticks.csv')
+    chunks = list(read_ticks(folder / 'ticks.csv', chunk_size=300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+    np.testing.assert_allclose(pd.concat(chunks)['price'].to_numpy(), ticks['price'].to_numpy())
+
+
+def test_read_ticks_compressed_csv(tmp_path):
+    ticks = _write_csv(tmp_path / 'ticks.csv.gz')
+    bars = TickBar(threshold=100).transform_file(str(tmp_path / 'ticks.csv.gz'), batch_size=250)
+    expected = TickBar(threshold=100).transform(ticks.set_index('datetime'))
+    # the integer volume of the file is kept, as for transform
+    pd.testing.assert_frame_equal(bars, expected, check_freq=False)
+
+
+def test_transform_file_with_dictcol(tmp_path):
+    ticks = _write_csv(tmp_path / 'ticks.csv').rename(columns={'price': 'px', 'volume': 'qty'})
+    ticks.to_csv(tmp_path / 'ticks.csv', index=False)
+    dictcol = {'px': 'price', 'qty': 'volume'}
+    bars = TickBar(threshold=100, dictcol=dictcol).transform_file(tmp_path / 'ticks.csv', batch_size=250)
+    expected = TickBar(threshold=100, dictcol=dictcol).transform(ticks.set_index('datetime'))
+    pd.testing.assert_frame_equal(bars, expected, check_freq=False)
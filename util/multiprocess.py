@@ -109,15 +109,10 @@ def mp_pandas_obj(func, pd_obj, num_threads=24, mp_batches=1, lin_mols=True, **k
     else:
         out = process_jobs(jobs, num_threads=num_threads)
 
-    if isinstance(out[0], pd.DataFrame):
-        df0 = pd.DataFrame()
-    elif isinstance(out[0], pd.Series):
-        df0 = pd.Series()
-    else:
+    if not isinstance(out[0], (pd.DataFrame, pd.Series)):
         return out
 
-    for i in out:
-        df0 = df0.append(i)
+    df0 = pd.concat(out)
 
     df0 = df0.sort_index()
     return df0
@@ -52,14 +52,14 @@ def sample_df(inputdf, freq='1D'):
 
     :return
     the dataframe that is resampled based on freq
+
+    For tick data, custombar.TimeBar builds the same bars in a single pass over the ticks.
     """
-    dfoutput           = pd.DataFrame()
-    dfoutput['open']   = inputdf.open.resample(freq).first()
-    dfoutput['close']  = inputdf.close.resample(freq).last()
-    dfoutput['low']    = inputdf.low.resample(freq).min()
-    dfoutput['high']   = inputdf.high.resample(freq).max()
+    how = {'open': 'first', 'close': 'last', 'low': 'min', 'high': 'max'}
     if 'volume' in inputdf.columns:
-        dfoutput['volume'] = inputdf.volume.resample(freq).sum()
+        how['volume'] = 'sum'
+    # one resample pass for all the columns
+    dfoutput = inputdf[list(how)].resample(freq).agg(how)
     dfoutput.sort_index(inplace=True)
     dfoutput.dropna(inplace=True)
     return dfoutput